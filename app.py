@@ -1,9 +1,52 @@
-from flask import Flask
+import base64
+import hashlib
+import hmac
+import json
+import os
+
+from flask import Flask, request
 app = Flask(__name__)
 
+TODOIST_CLIENT_SECRET = os.getenv('TODOIST_CLIENT_SECRET')
+
+# Called from Flask worker threads with each verified Todoist payload. The
+# bot registers a handler that hands events over to its own event loop.
+todoist_event_handlers = []
+
+
+def register_todoist_handler(handler):
+    todoist_event_handlers.append(handler)
+
+
+def verify_todoist_signature(body, signature, secret):
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).digest()
+    expected = base64.b64encode(digest).decode()
+    return hmac.compare_digest(expected, signature or '')
+
+
 @app.route('/')
 def home():
     return "Hello! I'm a Discord bot."
 
+
+@app.route('/todoist/webhook', methods=['POST'])
+def todoist_webhook():
+    if not TODOIST_CLIENT_SECRET:
+        return "Todoist webhooks are not configured.", 503
+
+    body = request.get_data()
+    signature = request.headers.get('X-Todoist-Hmac-SHA256')
+    if not verify_todoist_signature(body, signature, TODOIST_CLIENT_SECRET):
+        return "Invalid signature.", 401
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return "Invalid payload.", 400
+
+    for handler in todoist_event_handlers:
+        handler(payload)
+    return "", 200
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8080)
@@ -0,0 +1,104 @@
+# beeminder.py
+import asyncio
+import json
+import os
+
+import aiohttp
+import backoff
+
+from http_client import service_url
+
+BEEMINDER_TIMEOUT_SECONDS = float(os.getenv('BEEMINDER_TIMEOUT_SECONDS', '10'))
+BEEMINDER_MAX_TRIES = int(os.getenv('BEEMINDER_MAX_TRIES', '4'))
+
+
+class BeeminderError(Exception):
+
+  def __init__(self, status, message):
+    super().__init__(f"{status} - {message}")
+    self.status = status
+
+
+class BeeminderRetryableError(BeeminderError):
+  """Raised for 429 and 5xx responses, which are retried with backoff."""
+
+
+def datapoints_url(beeminder_username, goal):
+  return service_url(
+      'beeminder',
+      f"/users/{beeminder_username}/goals/{goal}/datapoints.json")
+
+
+async def _raise_for_status(response):
+  if response.status == 200:
+    return
+  error = await response.text()
+  if response.status == 429 or response.status >= 500:
+    raise BeeminderRetryableError(response.status, error)
+  raise BeeminderError(response.status, error)
+
+
+@backoff.on_exception(backoff.expo,
+                      (BeeminderRetryableError, aiohttp.ClientError,
+                       asyncio.TimeoutError),
+                      max_tries=BEEMINDER_MAX_TRIES)
+async def create_datapoints(session, beeminder_username, auth_token, goal,
+                            datapoints):
+  """Creates several datapoints in one request via Beeminder's create_all.
+
+  Each datapoint should carry a `requestid`, which Beeminder uses to
+  deduplicate, so retrying a batch never double-counts.
+  """
+  url = service_url(
+      'beeminder',
+      f"/users/{beeminder_username}/goals/{goal}/datapoints/create_all.json")
+  timeout = aiohttp.ClientTimeout(total=BEEMINDER_TIMEOUT_SECONDS)
+  async with session.post(url,
+                          data={
+                              'auth_token': auth_token,
+                              'datapoints': json.dumps(datapoints)
+                          },
+                          timeout=timeout) as response:
+    await _raise_for_status(response)
+    return await response.json()
+
+
+@backoff.on_exception(backoff.expo,
+                      (BeeminderRetryableError, aiohttp.ClientError,
+                       asyncio.TimeoutError),
+                      max_tries=BEEMINDER_MAX_TRIES)
+async def delete_datapoint(session, beeminder_username, auth_token, goal,
+                           datapoint_id):
+  url = service_url(
+      'beeminder',
+      f"/users/{beeminder_username}/goals/{goal}/datapoints/{datapoint_id}.json"
+  )
+  timeout = aiohttp.ClientTimeout(total=BEEMINDER_TIMEOUT_SECONDS)
+  async with session.delete(url,
+                            params={'auth_token': auth_token},
+                            timeout=timeout) as response:
+    await _raise_for_status(response)
+    return await response.json()
+
+
+@backoff.on_exception(backoff.expo,
+                      (BeeminderRetryableError, aiohttp.ClientError,
+                       asyncio.TimeoutError),
+                      max_tries=BEEMINDER_MAX_TRIES)
+async def fetch_goal(session, beeminder_username, auth_token, goal, etag=None):
+  """Fetches a goal, conditionally when `etag` is given.
+
+  Returns (goal_json, etag); goal_json is None when Beeminder answers 304.
+  """
+  url = service_url('beeminder',
+                    f"/users/{beeminder_username}/goals/{goal}.json")
+  headers = {'If-None-Match': etag} if etag else {}
+  timeout = aiohttp.ClientTimeout(total=BEEMINDER_TIMEOUT_SECONDS)
+  async with session.get(url,
+                         params={'auth_token': auth_token},
+                         headers=headers,
+                         timeout=timeout) as response:
+    if response.status == 304:
+      return None, etag
+    await _raise_for_status(response)
+    return await response.json(), response.headers.get('ETag')
@@ -1,24 +1,40 @@
 import os
+import io
 from dotenv import load_dotenv
 import discord
 from discord.ext import commands
 from discord.ui import Button, View, Modal, TextInput
-import aiohttp
 import time
 import json
 import threading
-from app import app
+from app import app, register_todoist_handler
 from wuphf import handle_wuphf
 from replit import db
 from database import database, fetch_query, execute_query
-from datetime import datetime, timedelta, date
+from profiles import load_profile, invalidate_profile
+from roster import ACTIVE_USERS_QUERY, fetch_active_users, get_roster, invalidate_roster, update_roster_member, remove_roster_member, active_members as roster_active_members, roster_display_name
+from http_client import get_session, close_session, service_url
+from beeminder import datapoints_url
+from outbox import beeminder_outbox, enqueue_datapoints, enqueue_standup, remove_latest_standups, missing_standup_days, plan_backfill, enqueue_backfill
+from schema import ensure_schema
+from todoist_mirror import get_todoist_mirror, apply_webhook_event, start_of_yesterday
+from graph_cache import fetch_graphs
+from goal_status import cached_goal_statuses, goal_status_refresher
+from voice_queue import VoiceEventQueue
+from ttl_cache import TTLCache
+from send_scheduler import send_scheduler
+from render import paginate, paginate_fields, send_paginated
+from quorum import get_quorum_tracker, peek_quorum_tracker, reset_quorum_tracker, reset_all_quorum_trackers
+from guild_config import warm_guild_configs, get_guild_config, invalidate_guild_config, claim_standup_date, is_monitored_channel
+from datetime import datetime, timedelta
 import pytz
 import asyncio
+from itertools import chain
 from goals import view_goals, add_goal
 from discord import Thread, Embed
-from daily_updates import fetch_user_info, fetch_todoist_token, fetch_tasks_from_todoist, fetch_completed_tasks_from_todoist, get_or_create_thread
-from habits import add_habit, delete_habit, record_habit_entry, fetch_completed_habits, fetch_user_habits, calculate_7_day_momentum
-import aiocron
+from daily_updates import fetch_tasks_from_todoist, fetch_completed_tasks_from_todoist, get_or_create_thread
+from habit_stats import recompute_habit_stats, habit_stats_schedule
+from habits import add_habit, delete_habit, record_habit_entry, fetch_completed_habits, fetch_user_habits, fetch_habit_summaries, calculate_7_day_momentum, habit_today
 import uuid
 
 # Load environment variables
@@ -28,14 +44,32 @@ import uuid
 
 TOKEN = os.environ['DISCORD_BOT_TOKEN']
 SANDBOX_MODE = False  # Change to True when you want to enable sandbox mode
+DAILY_UPDATE_CONCURRENCY = int(os.getenv('DAILY_UPDATE_CONCURRENCY', '5'))
+
+# Daily updates rendered ahead of the standup, keyed on (guild_id, member_id)
+prefetched_updates = TTLCache(
+    float(os.getenv('DAILY_UPDATE_PREFETCH_TTL_SECONDS', '900')))
+prefetch_tasks = {}
 
 # Define the intents
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
 
+
+class StandlyBot(commands.Bot):
+
+    async def setup_hook(self):
+        # Open the shared HTTP connection pool inside the bot's event loop
+        get_session()
+
+    async def close(self):
+        await super().close()
+        await close_session()
+
+
 # Initialize the bot
-bot = commands.Bot(command_prefix='!', intents=intents)
+bot = StandlyBot(command_prefix='!', intents=intents)
 
 
 async def db_heartbeat():
@@ -60,107 +94,65 @@ def generate_random_uuid():
     return str(uuid.uuid4())
 
 
-async def fetch_user_info(user_id, database):
-    # Assuming 'database' is an async database connection object
-    query = """
-      SELECT guild_id, discord_username
-      FROM users
-      WHERE discord_id = :user_id
-  """
-    result = await database.fetch_one(query, {'user_id': user_id})
-    print(f"fetch_user_info result: {result}")
-
-    if result:
-        return {
-            'guild_id': result['guild_id'],
-            'discord_username': result['discord_username']
-        }
-    return None
-
-
-async def fetch_active_users(guild_id):
-    query = """
-        SELECT discord_id, beeminder_username, beeminder_auth_token, attendance, missed_standup
-        FROM users
-        WHERE guild_id = :guild_id AND hiatus = FALSE;
-    """
-    return await fetch_query(query, {'guild_id': guild_id})
-
-
-#Log standups internally
+#Log standups internally, returning one result dict per active user
 async def log_standups_internal(guild_id, channel):
     # Fetch the goal for the guild
-    goal_query = """
-      SELECT goal
-      FROM guilds
-      WHERE guild_id = :guild_id;
-  """
-    goal_result = await fetch_query(goal_query, {'guild_id': guild_id})
+    guild_config = await get_guild_config(guild_id)
 
-    if not goal_result:
+    if not guild_config:
         print("No goal data available for this guild.")
-        return
+        return []
 
-    goal = goal_result[0]['goal']
+    goal = guild_config['goal']
 
     users = await fetch_active_users(guild_id)
 
     if not users:
         print("No user data available for this guild.")
-        return
+        return []
 
-    successful_requests = 0
-    errors = []
+    post_data = {
+        'timestamp': int(time.time()),
+        'value': 1,
+        'comment': 'logged via discord bot'
+    }
 
-    async with aiohttp.ClientSession() as session:
+    if SANDBOX_MODE:
+        # Mock POST for demonstration
+        results = []
+        sends = []
         for user in users:
             beeminder_username = user['beeminder_username']
-            auth_token = user['beeminder_auth_token']
-            apiUrl = f"https://www.beeminder.com/api/v1/users/{beeminder_username}/goals/{goal}/datapoints.json"
-            postData = {
-                'auth_token': auth_token,
-                'timestamp': int(time.time()),
-                'value': 1,
-                'comment': 'logged via discord bot'
-            }
-
-            if SANDBOX_MODE:
-                # Mock POST for demonstration
-                await channel.send(
-                    f"Mock POST to {apiUrl} with data: {postData}")
-                successful_requests += 1
-            else:
-                try:
-                    async with session.post(apiUrl, data=postData) as response:
-                        if response.status == 200:
-                            successful_requests += 1
-                        else:
-                            error = await response.text()
-                            errors.append(
-                                f"Error for {beeminder_username}: {response.status} - {error}"
-                            )
-                except Exception as e:
-                    errors.append(
-                        f"Exception for {beeminder_username}: {str(e)}")
-
-    if successful_requests == len(users):
+            sends.append(
+                send_scheduler.send(
+                    channel,
+                    f"Mock POST to {datapoints_url(beeminder_username, goal)} with data: {post_data}"
+                ))
+            results.append({
+                'beeminder_username': beeminder_username,
+                'ok': True,
+                'error': None
+            })
+        await asyncio.gather(*sends)
+        return results
+
+    # Go through the outbox so failed posts are retried in the background
+    central_tz = pytz.timezone('America/Chicago')
+    request_ids = await enqueue_datapoints(guild_id, goal, users,
+                                           datetime.now(central_tz).date(),
+                                           post_data['timestamp'])
+    results = await beeminder_outbox.dispatch(request_ids)
+
+    errors = [
+        f"Error for {result['beeminder_username']}: {result['error']}"
+        for result in results if not result['ok']
+    ]
+    if not errors:
         print("Standup logged successfully for all users.")
     else:
         error_messages = '\n'.join(errors)
-        print(f"Errors occurred:\n{error_messages}")
-
-
-async def determine_streak_update(last_entry_date, entry_date):
-    central_tz = pytz.timezone('America/Chicago')
-    last_entry_date = last_entry_date.astimezone(
-        central_tz) if last_entry_date else None
-    entry_date = entry_date.astimezone(central_tz)
-
-    if last_entry_date is None or last_entry_date.date(
-    ) != entry_date.date() - timedelta(days=1):
-        return 1
-    else:
-        return 1
+        print(f"Errors occurred (queued for retry):\n{error_messages}")
+    return results
 
 
 def make_button_callback(user_id, habit_id, habit_title):
@@ -191,12 +183,33 @@ async def on_ready():
         print("Attempting to connect to the database...")
         await database.connect()
         print("Successfully connected to the database.")
+        await ensure_schema()
+        await warm_guild_configs()
+        # Voice state may have changed while disconnected; trackers are
+        # rebuilt from the channels on the next event
+        reset_all_quorum_trackers()
+        beeminder_outbox.start()
+        goal_status_refresher.start()
+        habit_stats_schedule.start()
         # Start the heartbeat task
         bot.loop.create_task(db_heartbeat())
     except Exception as e:
         print(f"Failed to connect to the database: {e}")
 
 
+@bot.event
+async def on_member_update(before, after):
+    update_roster_member(after)
+
+
+@bot.event
+async def on_member_remove(member):
+    remove_roster_member(member)
+    tracker = peek_quorum_tracker(member.guild.id)
+    if tracker is not None:
+        tracker.set_active(member.id, False)
+
+
 @bot.event
 async def on_disconnect():
     print("Bot is disconnecting...")
@@ -213,41 +226,54 @@ async def toggle_sandbox_mode(ctx):
         f"Sandbox mode is now {'True' if SANDBOX_MODE else 'False'}.")
 
 
-@bot.command(name='graphs', help='Display Beeminder graphs for all users')
+@bot.command(name='graphs', help='Display Beeminder graphs for all active users')
 async def graphs(ctx):
-    timestamp = int(time.time())
     guild_id = ctx.guild.id
 
     # Fetch the goal for the guild
-    goal_query = """
-        SELECT goal
-        FROM guilds
-        WHERE guild_id = :guild_id;
-    """
-    goal_result = await fetch_query(goal_query, {'guild_id': guild_id})
+    guild_config = await get_guild_config(guild_id)
 
-    if not goal_result:
+    if not guild_config:
         await ctx.send("No goal data available for this guild.")
         return
 
-    goal = goal_result[0]['goal']
+    goal = guild_config['goal']
 
-    # Fetch Beeminder usernames for users in the guild
-    user_query = """
-        SELECT beeminder_username
-        FROM users
-        WHERE guild_id = :guild_id;
-    """
-    users = await fetch_query(user_query, {'guild_id': guild_id})
+    # Same users as the goal status cache, so every graph has a cached
+    # updated_at to key on
+    users = await fetch_active_users(guild_id)
 
     if not users:
         await ctx.send("No user data available.")
         return
 
-    for user in users:
-        beeminder_username = user['beeminder_username']
-        graph_url = f"https://www.beeminder.com/{beeminder_username}/{goal}.png?{timestamp}"
-        await ctx.send(f"Graph for {beeminder_username}: {graph_url}")
+    beeminder_usernames = [user['beeminder_username'] for user in users]
+    graphs = await fetch_graphs(goal, beeminder_usernames,
+                                cached_goal_statuses(guild_id))
+
+    # Up to 10 graphs per message, one embed and attachment each
+    embeds, files, missing = [], [], []
+    for index, (beeminder_username, data) in enumerate(graphs):
+        if data is None:
+            missing.append(beeminder_username)
+            continue
+        filename = f"graph-{index}.png"
+        files.append(discord.File(io.BytesIO(data), filename=filename))
+        embed = Embed(title=f"Graph for {beeminder_username}")
+        embed.set_image(url=f"attachment://{filename}")
+        embeds.append(embed)
+    sends = [
+        send_scheduler.send(ctx.channel,
+                            embeds=embeds[start:start + 10],
+                            files=files[start:start + 10])
+        for start in range(0, len(embeds), 10)
+    ]
+    if missing:
+        sends.append(
+            send_scheduler.send(
+                ctx.channel,
+                f"Could not fetch graphs for: {', '.join(missing)}"))
+    await asyncio.gather(*sends)
 
 
 @bot.command(name='logstandups',
@@ -255,20 +281,13 @@ async def graphs(ctx):
 async def log_standups(ctx):
     guild_id = ctx.guild.id
 
-    # Use fetch_query with the guild information query
-    guild_query = """
-    SELECT monitored_channel_name, monitored_channel_id, last_log_date
-    FROM guilds WHERE guild_id = :guild_id;
-    """
-    guild_info_result = await fetch_query(guild_query, {"guild_id": guild_id})
+    guild_info = await get_guild_config(guild_id)
 
     # Check if guild information is available
-    if not guild_info_result or len(guild_info_result) == 0:
+    if not guild_info:
         await ctx.send("Monitored channel not set for this guild.")
         return
 
-    # Extract guild information
-    guild_info = guild_info_result[0]
     channel_name = guild_info['monitored_channel_name']
 
     # Find the channel by name
@@ -278,8 +297,17 @@ async def log_standups(ctx):
         return
 
     # Call log_standups_internal function with the found channel
-    await log_standups_internal(guild_id, channel)
-    await ctx.send("Standups logged for all users.")
+    results = await log_standups_internal(guild_id, channel)
+    failed = [result for result in results if not result['ok']]
+    if failed:
+        # Errors can carry raw Beeminder response bodies, so page them
+        await send_paginated(ctx.channel, [
+            f"Standups logged for {len(results) - len(failed)} of {len(results)} users. Errors:",
+            *(f"{result['beeminder_username']}: {result['error']}"
+              for result in failed)
+        ])
+    else:
+        await ctx.send("Standups logged for all users.")
 
 
 @bot.command(name='removestandups',
@@ -288,18 +316,13 @@ async def remove_standups(ctx):
     guild_id = ctx.guild.id
 
     # Fetch the goal for the guild
-    goal_query = """
-  SELECT goal
-  FROM guilds
-  WHERE guild_id = :guild_id;
-  """
-    goal_result = await fetch_query(goal_query, {'guild_id': guild_id})
+    guild_config = await get_guild_config(guild_id)
 
-    if not goal_result:
+    if not guild_config:
         await ctx.send("No goal data available for this guild.")
         return
 
-    goal = goal_result[0]['goal']
+    goal = guild_config['goal']
 
     users = await fetch_active_users(guild_id)
 
@@ -307,192 +330,244 @@ async def remove_standups(ctx):
         await ctx.send("No user data available for this guild.")
         return
 
-    successful_deletions = 0
-    errors = []
+    results = await remove_latest_standups(guild_id, goal)
+    errors = [
+        f"Error for {result['beeminder_username']}: {result['error']}"
+        for result in results if not result['ok']
+    ]
+    recorded = {result['beeminder_username'] for result in results}
+    errors.extend(f"No recorded data point for {user['beeminder_username']}"
+                  for user in users
+                  if user['beeminder_username'] not in recorded)
+
+    if not errors:
+        await ctx.send(
+            "Most recent data point removed successfully for all users.")
+    else:
+        error_messages = '\n'.join(errors)
+        await ctx.send(f"Errors occurred during deletion:\n{error_messages}")
+
+
+@bot.command(name='standupstatus',
+             help='Show how close each user is to derailing, from cache')
+async def standup_status(ctx):
+    guild_id = ctx.guild.id
+
+    guild_config = await get_guild_config(guild_id)
+    if not guild_config:
+        await ctx.send("No goal data available for this guild.")
+        return
+
+    statuses = cached_goal_statuses(guild_id)
+    if not statuses:
+        goal_status_refresher.refresh_soon(guild_id, guild_config['goal'])
+        await ctx.send(
+            "Goal status is being fetched from Beeminder, try again shortly.")
+        return
 
-    async with aiohttp.ClientSession() as session:
-        for user in users:
-            beeminder_username = user['beeminder_username']
-            auth_token = user['beeminder_auth_token']
+    # Closest to derailing first
+    ordered = sorted(statuses.values(),
+                     key=lambda status: (status.safebuf is None,
+                                         status.safebuf or 0))
+    lines = [f"📉 **Standup Status ({guild_config['goal']})** 📉", ""]
+    for status in ordered:
+        last = status.last_datapoint or {}
+        last_date = datetime.fromtimestamp(
+            last['timestamp']).date() if last.get('timestamp') else "never"
+        lines.append(
+            f"👤 **{status.beeminder_username}** - 🛟 Safe days: {status.safebuf} | "
+            f"Rate: {status.rate}/{status.runits} | Last: {last_date}")
+    oldest = min(status.fetched_at for status in ordered)
+    lines.append("")
+    lines.append(
+        f"*Updated {int((time.time() - oldest) // 60)} minutes ago.*")
+    await send_paginated(ctx.channel, lines)
 
-            # Fetch the most recent data point for the user
-            data_point_id = await fetch_most_recent_data_point_id(
-                beeminder_username, auth_token, goal)
 
-            if not data_point_id:
-                errors.append(f"No data point found for {beeminder_username}")
-                continue
+@bot.command(
+    name='backfillstandups',
+    help=
+    'Log missed standup days from the last few days. Usage: !backfillstandups [max_days]'
+)
+async def backfill_standups(ctx, max_days: int = 7):
+    guild_id = ctx.guild.id
 
-            delete_url = f"https://www.beeminder.com/api/v1/users/{beeminder_username}/goals/{goal}/datapoints/{data_point_id}.json?auth_token={auth_token}"
+    guild_config = await get_guild_config(guild_id)
+    if not guild_config:
+        await ctx.send("No goal data available for this guild.")
+        return
 
-            try:
-                async with session.delete(delete_url) as response:
-                    if response.status == 200:
-                        successful_deletions += 1
-                    else:
-                        error = await response.text()
-                        errors.append(
-                            f"Error for {beeminder_username}: {response.status} - {error}"
-                        )
-            except Exception as e:
-                errors.append(f"Exception for {beeminder_username}: {str(e)}")
+    goal = guild_config['goal']
+    users = await fetch_active_users(guild_id)
+    if not users:
+        await ctx.send("No user data available for this guild.")
+        return
 
-    if successful_deletions == len(users):
-        await ctx.send(
-            "Most recent data point removed successfully for all users.")
-    else:
-        error_messages = '\n'.join(errors)
-        await ctx.send(f"Errors occurred during deletion:\n{error_messages}")
+    central_tz = pytz.timezone('America/Chicago')
+    today_date = datetime.now(central_tz).date()
+    days = missing_standup_days(today_date, max_days)
+    plan = await plan_backfill(guild_id, goal, users, days)
+    if not plan:
+        await ctx.send("No missing standup days to backfill.")
+        return
 
+    summary = [
+        f"- {beeminder_username}: {', '.join(str(day) for day in missing)}"
+        for beeminder_username, missing in plan.items()
+    ]
+    if SANDBOX_MODE:
+        await send_paginated(ctx.channel, ["Dry run, would backfill:", *summary])
+        return
 
-async def fetch_most_recent_data_point_id(beeminder_username, auth_token,
-                                          goal):
-    url = f"https://www.beeminder.com/api/v1/users/{beeminder_username}/goals/{goal}/datapoints.json?auth_token={auth_token}"
+    request_ids = await enqueue_backfill(guild_id, goal, plan, central_tz)
+    await execute_query(
+        """
+        UPDATE guilds
+        SET last_log_date = GREATEST(COALESCE(last_log_date, :last_day), :last_day)
+        WHERE guild_id = :guild_id;
+        """, {
+            'last_day': days[-1],
+            'guild_id': guild_id
+        })
+    invalidate_guild_config(guild_id)
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data_points = await response.json()
-
-                    if not data_points:
-                        print(f"No data points found for {beeminder_username}")
-                        return None
-
-                    # Sort the data points by the 'updated_at' or 'timestamp' field to find the most recent one
-                    most_recent_data_point = max(data_points,
-                                                 key=lambda x: x['timestamp'])
-
-                    # Return the ID of the most recent data point
-                    return most_recent_data_point['id']
-                else:
-                    error = await response.text()
-                    print(
-                        f"Error fetching data points for {beeminder_username}: {response.status} - {error}"
-                    )
-                    return None
-        except Exception as e:
-            print(
-                f"Exception occurred while fetching data points for {beeminder_username}: {str(e)}"
-            )
-            return None
+    # The dispatcher sends each user's days in a single create_all request
+    results = await beeminder_outbox.dispatch(request_ids)
+    failed = [result for result in results if not result['ok']]
+    lines = ["Backfilled standups:", *summary]
+    if failed:
+        lines.append(
+            f"{len(failed)} datapoints failed to send; retryable ones stay queued.")
+    await send_paginated(ctx.channel, lines)
 
 
 @bot.event
 async def on_voice_state_update(member, before, after):
     print(f"Voice state update detected for member: {member.name}")
 
-    if before.channel != after.channel:
-        print(f"Member {member.name} changed channels.")
-        guild = after.channel.guild if after.channel else before.channel.guild
-        if after.channel:
-            print(f"Member {member.name} joined channel: {after.channel.name}")
-
-            guild_id = after.channel.guild.id
-
-            # Fetch guild information
-            guild_query = """
-            SELECT monitored_channel_name, last_log_date
-            FROM guilds
-            WHERE guild_id = :guild_id;
-            """
-            guild_info_result = await fetch_query(guild_query,
-                                                  {"guild_id": guild_id})
-
-            if guild_info_result and len(guild_info_result) > 0:
-                guild_info = guild_info_result[0]
-                monitored_channel_name = guild_info['monitored_channel_name']
-
-                if monitored_channel_name and after.channel.name == monitored_channel_name:
-                    print(
-                        f"Member {member.name} joined the monitored channel: {monitored_channel_name}"
-                    )
-                    central_tz = pytz.timezone(
-                        'America/Chicago')  # Central Time Zone
-                    central_time = datetime.now(central_tz)
-                    today = central_time.strftime('%Y-%m-%d')
-                    today_date = datetime.strptime(today, '%Y-%m-%d').date()
-                    last_log_date = guild_info['last_log_date']
-
-                    # Fetch active users (Refactored to use fetch_active_users function)
-                    active_users = await fetch_active_users(guild_id)
-                    active_user_ids = {
-                        user['discord_id']
-                        for user in active_users
-                    }
-                    active_members = []
-
-                    # Fetch Member objects for each active user ID
-                    for user_id in active_user_ids:
-                        try:
-                            member = await guild.fetch_member(user_id)
-                            if member:
-                                active_members.append(member)
-                        except Exception as e:
-                            print(
-                                f"Error fetching member with ID {user_id}: {e}"
-                            )
-                    # Count active members (Refactored to use active_members list)
-                    user_count = len(active_members)
-
-                    print("dates", today_date, last_log_date)
-                    # Adjust condition based on sandbox mode
-                    if SANDBOX_MODE:
-                        condition = (len(after.channel.members) == 1)
-                    else:
-                        condition = (len(after.channel.members) == user_count
-                                     and today_date != last_log_date)
-
-                    if condition:
-                        print("Logging standup...")
-                        text_channel = discord.utils.get(
-                            after.channel.guild.text_channels,
-                            name=monitored_channel_name)
-                        if text_channel:
-                            await log_standups_internal(guild_id, text_channel)
-                            # Update the last log date in the database
-                            update_query = """
-                            UPDATE guilds SET last_log_date = :today WHERE guild_id = :guild_id;
-                            """
-                            await execute_query(update_query, {
-                                'today': today_date,
-                                'guild_id': guild_id
-                            })
-                            await text_channel.send(
-                                f"Standup logged for users in the channel on {today}"
-                            )
-                            print("Standup log message sent.")
-                            # Trigger daily updates for each user in the voice channel
-                            monitored_channel = discord.utils.get(
-                                member.guild.text_channels,
-                                name=monitored_channel_name)
-                            for member in active_members:
-                                try:
-                                    await direct_daily_update(
-                                        member, monitored_channel)
-                                    print(
-                                        f"Daily update triggered for {member.display_name}"
-                                    )
-                                except Exception as e:
-                                    print(
-                                        f"Failed to trigger daily update for {member.display_name}: {e}"
-                                    )
-                        else:
-                            print(
-                                f"Monitored text channel '{monitored_channel_name}' not found."
-                            )
-                    else:
-                        print("Conditions for logging standup not met.")
-            else:
-                print(
-                    "Guild information not found or the user did not join the monitored channel."
-                )
-        else:
-            print(f"Member {member.name} left channel: {before.channel.name}")
-    else:
+    if before.channel == after.channel:
         print(
             f"Member {member.name} had a voice state change in the same channel."
         )
+        return
+
+    print(f"Member {member.name} changed channels.")
+
+    # Guild information comes from the in-process config cache
+    guild_info = await get_guild_config(member.guild.id)
+    if not guild_info:
+        print("Guild information not found.")
+        return
+
+    left_monitored = is_monitored_channel(guild_info, before.channel)
+    joined_monitored = is_monitored_channel(guild_info, after.channel)
+    if left_monitored or joined_monitored:
+        voice_events.submit(member.guild.id,
+                            (member, before.channel if left_monitored else None,
+                             after.channel if joined_monitored else None))
+
+
+async def process_voice_events(guild_id, events):
+    guild = bot.get_guild(guild_id)
+    guild_info = await get_guild_config(guild_id)
+    if not guild or not guild_info:
+        return
+
+    joined_channel = None
+    for member, left_channel, channel in events:
+        tracker = await get_quorum_tracker(guild, channel or left_channel)
+        if left_channel:
+            print(f"Member {member.name} left channel: {left_channel.name}")
+            tracker.leave(member.id)
+        if channel:
+            print(
+                f"Member {member.name} joined the monitored channel: {channel.name}"
+            )
+            tracker.join(member.id)
+            joined_channel = channel
+
+    # Only joins can complete the quorum
+    if not joined_channel:
+        return
+    tracker.sync_present(member.id for member in joined_channel.members)
+
+    central_tz = pytz.timezone('America/Chicago')  # Central Time Zone
+    today_date = datetime.now(central_tz).date()
+    last_log_date = guild_info['last_log_date']
+
+    print("dates", today_date, last_log_date)
+    if today_date != last_log_date:
+        start_prefetch(guild, today_date)
+
+    # Adjust condition based on sandbox mode
+    if SANDBOX_MODE:
+        condition = (len(joined_channel.members) == 1)
+    else:
+        condition = (today_date != last_log_date
+                     and tracker.try_fire(today_date))
+
+    if condition:
+        await trigger_standup(guild, guild_info, today_date)
+    else:
+        print("Conditions for logging standup not met.")
+
+
+voice_events = VoiceEventQueue(
+    process_voice_events,
+    debounce_seconds=float(os.getenv('VOICE_DEBOUNCE_SECONDS', '2')))
+
+
+async def claim_and_enqueue_standup(guild_id, goal, today_date):
+    # The claim and the outbox rows commit together; only the caller that
+    # claims today's date does any outbound work.
+    # Users are read inside the transaction so a failed read rolls back the
+    # claim instead of marking the day logged with nothing enqueued.
+    try:
+        async with database.transaction():
+            claimed = await claim_standup_date(guild_id, today_date)
+            if claimed:
+                users = await database.fetch_all(ACTIVE_USERS_QUERY,
+                                                 {'guild_id': guild_id})
+                await enqueue_standup(guild_id, goal, users, today_date,
+                                      int(time.time()))
+    except Exception as e:
+        print(f"Error claiming standup for guild {guild_id}: {e}")
+        invalidate_guild_config(guild_id)
+        # Nothing was claimed, so let the next complete quorum try again
+        tracker = peek_quorum_tracker(guild_id)
+        if tracker is not None:
+            tracker.rearm(today_date)
+        return False
+
+    if not claimed:
+        print(f"Standup for {today_date} already claimed for guild {guild_id}.")
+        return False
+    beeminder_outbox.wake()
+    return True
+
+
+async def trigger_standup(guild, guild_info, today_date):
+    print("Logging standup...")
+    guild_id = guild.id
+    monitored_channel_name = guild_info['monitored_channel_name']
+    text_channel = discord.utils.get(guild.text_channels,
+                                     name=monitored_channel_name)
+    if not text_channel:
+        print(f"Monitored text channel '{monitored_channel_name}' not found.")
+        return
+
+    if SANDBOX_MODE:
+        await log_standups_internal(guild_id, text_channel)
+    elif not await claim_and_enqueue_standup(guild_id, guild_info['goal'],
+                                             today_date):
+        return
+    await send_scheduler.send(
+        text_channel, f"Standup logged for users in the channel on {today_date}")
+    print("Standup log message sent.")
+
+    # Trigger daily updates for each active member
+    roster = await get_roster(guild)
+    await run_daily_updates(roster_active_members(roster), text_channel)
 
 
 @bot.command(name='wuphf', help='Send a WUPHF to a user')
@@ -511,12 +586,8 @@ async def wuphf(ctx, member: discord.Member):
 async def info(ctx):
     guild_id = ctx.guild.id
 
-    # Query to get guild information
-    guild_query = """
-    SELECT monitored_channel_name, monitored_channel_id, last_log_date
-    FROM guilds WHERE guild_id = :guild_id;
-    """
-    guild_info = await fetch_query(guild_query, {"guild_id": guild_id})
+    # Get guild information from the config cache
+    guild_info = await get_guild_config(guild_id)
 
     # Fetch the number of users
     user_count_query = "SELECT COUNT(*) FROM users WHERE guild_id = :guild_id;"
@@ -525,11 +596,11 @@ async def info(ctx):
     user_count = user_count_result[0][0] if user_count_result else 0
 
     sandbox_status = 'Enabled' if SANDBOX_MODE else 'Disabled'
-    monitored_channel = guild_info[0][
+    monitored_channel = guild_info[
         'monitored_channel_name'] if guild_info else "Not set"
-    monitored_channel_id = guild_info[0][
+    monitored_channel_id = guild_info[
         'monitored_channel_id'] if guild_info else "Not set"
-    last_log_date = guild_info[0][
+    last_log_date = guild_info[
         'last_log_date'] if guild_info else "Not available"
 
     info_message = (
@@ -541,101 +612,68 @@ async def info(ctx):
     await ctx.send(info_message)
 
 
-async def fetch_habit_completion_days(user_id, habit_id, database):
-    # Calculate the date range for the last 7 days
-    today = date.today()
-    seven_days_ago = today - timedelta(days=6)  # Include today in the count
-
-    completion_query = """
-  SELECT COUNT(DISTINCT DATE(entry_date)) AS completed_days
-  FROM habit_entries
-  WHERE user_id = :user_id AND habit_id = :habit_id AND entry_date BETWEEN :start_date AND :end_date
-  """
-    result = await database.fetch_one(
-        completion_query, {
-            'user_id': user_id,
-            'habit_id': habit_id,
-            'start_date': seven_days_ago,
-            'end_date': today
-        })
-    return result['completed_days'] if result else 0
-
-
-async def get_task_summary(user_id, database):
-    todoist_token = await fetch_todoist_token(user_id, database)
+async def get_task_summary(profile):
+    user_id = profile['discord_id']
+    todoist_token = profile['todoist_api_token']
     if not todoist_token:
-        return None, "Todoist API token not found. Please set it up."
-
-    completed_tasks = await fetch_completed_tasks_from_todoist(todoist_token)
-    today_tasks = await fetch_tasks_from_todoist(todoist_token, "today")
-    overdue_tasks = await fetch_tasks_from_todoist(todoist_token, "overdue")  # Fetch overdue tasks
+        return None, "Todoist API token not found. Please set it up.", None
 
-    completed_tasks_str = "\n".join([
+    try:
+        # At most one incremental sync, then every view is computed locally
+        mirror = await get_todoist_mirror(user_id, todoist_token)
+        today_date = datetime.now(pytz.timezone('America/Chicago')).date()
+        completed_tasks = mirror.completed_tasks_since(start_of_yesterday())
+        today_tasks = mirror.today_tasks(today_date)
+        overdue_tasks = mirror.overdue_tasks(today_date)
+    except Exception as e:
+        print(f"Todoist sync failed for {user_id}, using REST filters: {e}")
+        # The three Todoist calls are independent, so run them together
+        completed_tasks, today_tasks, overdue_tasks = await asyncio.gather(
+            fetch_completed_tasks_from_todoist(todoist_token),
+            fetch_tasks_from_todoist(todoist_token, "today"),
+            fetch_tasks_from_todoist(todoist_token, "overdue"))
+
+    completed_tasks_lines = [
         f"✅ {task['content']}" for task in completed_tasks
-    ]) if completed_tasks else "No tasks completed yesterday."
+    ] if completed_tasks else ["No tasks completed yesterday."]
 
-    today_tasks_str = "\n".join([
+    today_tasks_lines = [
         f"🕒 {task[0]}" for task in today_tasks
-    ]) if today_tasks else "You're all clear for today!"
+    ] if today_tasks else ["You're all clear for today!"]
 
-    overdue_tasks_str = "\n".join([
+    overdue_tasks_lines = [
         f"⚠️ {task[0]}" for task in overdue_tasks
-    ]) if overdue_tasks else None  # Only include if there are overdue tasks
+    ] if overdue_tasks else None  # Only include if there are overdue tasks
 
-    return completed_tasks_str, today_tasks_str, overdue_tasks_str
+    return completed_tasks_lines, today_tasks_lines, overdue_tasks_lines
 
 
 
-async def create_habit_embed(user_id, database):
-    habit_embed = Embed(title="💪 Habit Tracker", color=0x00ff00)
-    habits = await fetch_user_habits(user_id)
-    if habits:
-        for habit in habits:
-            completed_days = await fetch_habit_completion_days(
-                str(user_id), habit['id'], database)
-            habit_embed.add_field(
-                name=f"{habit['title']}",
-                value=
-                f"Streak: {habit['streak']} | Overall: {habit['overall_counter']} | Last 7 Days: {completed_days}/7",
-                inline=False)
-    else:
-        habit_embed.description = "No habits recorded."
+async def create_habit_embeds(user_id):
+    # Returns a list of embeds, split when a user has more than 25 habits
+    habits = await fetch_habit_summaries(user_id)
+    fields = [(
+        f"{habit['title']}",
+        f"Streak: {habit['streak']} | Best: {habit['longest_streak']} | Overall: {habit['overall_counter']} | Last 7 Days: {habit['completed_days']}/7 | 30-Day Momentum: {habit['momentum_30']}%",
+        False) for habit in habits]
 
-    return habit_embed
+    return paginate_fields(fields,
+                           title="💪 Habit Tracker",
+                           color=0x00ff00,
+                           description="No habits recorded.")
 
 
-def format_task_message(completed_tasks_str, today_tasks_str, overdue_tasks_str=None):
-    base_message = "🎯 **Completed Tasks Yesterday:**\n"
-    additional_message = "\n🚀 **Today's Tasks:**\n"
-    overdue_message = "\n⏰ **Overdue Tasks:**\n" if overdue_tasks_str else ""
-    available_length = 2000 - len(base_message) - len(additional_message) - len(overdue_message) - 100  # 100 characters reserved for potential truncation message
-
-    if overdue_tasks_str:
-        full_message = f"{base_message}{completed_tasks_str}\n{overdue_message}{overdue_tasks_str}\n{additional_message}{today_tasks_str}"
-    else:
-        full_message = f"{base_message}{completed_tasks_str}\n{additional_message}{today_tasks_str}"
-
-    if len(full_message) > 2000:
-        # Calculate how much space we can use for each part
-        half_length = available_length // 2
-        truncated_completed_tasks = (
-            completed_tasks_str[:half_length] + '...'
-        ) if len(completed_tasks_str) > half_length else completed_tasks_str
-        truncated_today_tasks = (
-            today_tasks_str[:half_length] +
-            '...') if len(today_tasks_str) > half_length else today_tasks_str
-        truncated_overdue_tasks = (
-            overdue_tasks_str[:half_length] +
-            '...') if len(overdue_tasks_str) > half_length else overdue_tasks_str
-
-        if overdue_tasks_str:
-            message = f"{base_message}{truncated_completed_tasks}\n{overdue_message}{truncated_overdue_tasks}\n{additional_message}{truncated_today_tasks}\n*Not all tasks are displayed due to message length limits.*"
-        else:
-            message = f"{base_message}{truncated_completed_tasks}\n{additional_message}{truncated_today_tasks}\n*Not all tasks are displayed due to message length limits.*"
-    else:
-        message = full_message
-
-    return message
+def format_task_message(completed_tasks_lines, today_tasks_lines, overdue_tasks_lines=None):
+    # Yields the message line by line; callers paginate instead of truncating
+    yield "🎯 **Completed Tasks Yesterday:**"
+    yield from completed_tasks_lines
+    if overdue_tasks_lines:
+        yield ""
+        yield "⏰ **Overdue Tasks:**"
+        yield from overdue_tasks_lines
+    yield ""
+    yield "🚀 **Today's Tasks:**"
+    yield from today_tasks_lines
 
 
 async def fetch_subscribed_users():
@@ -654,11 +692,7 @@ async def set_channel(ctx, *, channel_name: str):
 
     if voice_channel:
         # Check if the guild is already in the database
-        check_guild_query = """
-      SELECT guild_id FROM guilds WHERE guild_id = :guild_id;
-    """
-        guild_exists = await fetch_query(check_guild_query,
-                                         {"guild_id": guild_id})
+        guild_exists = await get_guild_config(guild_id)
 
         # If the guild is not in the database, insert it
         if not guild_exists:
@@ -686,43 +720,129 @@ async def set_channel(ctx, *, channel_name: str):
                     "monitored_channel_name": channel_name
                 })
 
+        invalidate_guild_config(guild_id)
+        # Presence was tracked for the old channel; rebuild from the new one
+        reset_quorum_tracker(guild_id)
         await ctx.send(
             f"Voice channel '{channel_name}' is now being monitored.")
     else:
         await ctx.send(f"No voice channel named '{channel_name}' found.")
 
 
-async def direct_daily_update(member: discord.Member, channel: discord.TextChannel):
-    print('Running daily command')
-    user_info = await fetch_user_info(member.id, database)
+async def build_daily_update(member: discord.Member):
+    # Gathers everything for one member's update without sending anything
+    user_info = await load_profile(member.guild.id, member.id)
     if not user_info:
-        await channel.send("Could not find user information in the database.")
-        return
+        return {'error': "Could not find user information in the database."}
 
-    guild_id = user_info['guild_id']
-    guild = bot.get_guild(guild_id)
+    guild = bot.get_guild(user_info['guild_id'])
     if not guild:
-        await channel.send(
-            "Could not find the guild associated with the user information.")
-        return
+        return {
+            'error':
+            "Could not find the guild associated with the user information."
+        }
 
-    thread = await get_or_create_thread(channel, member.display_name)
+    (completed_tasks_lines, today_tasks_lines,
+     overdue_tasks_lines), habit_embeds = await asyncio.gather(
+         get_task_summary(user_info),
+         create_habit_embeds(member.id))
+    if not completed_tasks_lines:  # This will be None if the token wasn't found
+        # today_tasks_lines contains the error message
+        return {'pages': [today_tasks_lines], 'embeds': []}
 
-    completed_tasks_str, today_tasks_str, overdue_tasks_str = await get_task_summary(
-        member.id, database)
-    if not completed_tasks_str:  # This will be None if the token wasn't found
-        await thread.send(today_tasks_str)  # This contains the error message
+    lines = chain([f"🌟 **Daily Update for {member.display_name}** 🌟", ""],
+                  format_task_message(completed_tasks_lines, today_tasks_lines,
+                                      overdue_tasks_lines))
+    return {'pages': list(paginate(lines)), 'embeds': habit_embeds}
+
+
+async def send_daily_update(member: discord.Member,
+                            channel: discord.TextChannel, update):
+    if 'error' in update:
+        await send_scheduler.send(channel, update['error'])
         return
 
-    task_message = f"🌟 **Daily Update for {member.display_name}** 🌟\n\n"
-    task_message += format_task_message(completed_tasks_str, today_tasks_str, overdue_tasks_str)
+    thread = await get_or_create_thread(channel, member.display_name,
+                                        member.id, database)
+    # The habit embeds ride along with the last page of task text
+    pages = update['pages']
+    sends = [send_scheduler.send(thread, page) for page in pages[:-1]]
+    embeds = update['embeds']
+    sends.append(send_scheduler.send(thread, pages[-1], embeds=embeds[:10]))
+    sends.extend(
+        send_scheduler.send(thread, embeds=embeds[start:start + 10])
+        for start in range(10, len(embeds), 10))
+    await asyncio.gather(*sends)
+
+
+async def build_daily_updates(members):
+    # Builds updates concurrently under a cap; None for members that failed
+    semaphore = asyncio.Semaphore(DAILY_UPDATE_CONCURRENCY)
+
+    async def build(member):
+        async with semaphore:
+            try:
+                return await build_daily_update(member)
+            except Exception as e:
+                print(
+                    f"Failed to build daily update for {member.display_name}: {e}"
+                )
+                return None
+
+    return await asyncio.gather(*(build(member) for member in members))
+
 
-    await thread.send(task_message)
+async def prefetch_daily_updates(guild):
+    roster = await get_roster(guild)
+    members = roster_active_members(roster)
+    updates = await build_daily_updates(members)
+    for member, update in zip(members, updates):
+        if update is not None:
+            prefetched_updates.set((guild.id, member.id), update)
+    print(f"Prefetched {len(members)} daily updates for guild {guild.id}.")
 
-    habit_embed = await create_habit_embed(member.id, database)
-    await thread.send(embed=habit_embed)
+
+def start_prefetch(guild, today_date):
+    # Speculatively render daily updates once per day, on the first join
+    started = prefetch_tasks.get(guild.id)
+    if started and started[0] == today_date:
+        return
+    prefetch_tasks[guild.id] = (today_date,
+                                asyncio.create_task(
+                                    prefetch_daily_updates(guild)))
 
 
+async def run_daily_updates(members, channel: discord.TextChannel):
+    # Wait for a prefetch still in flight rather than duplicating its work
+    started = prefetch_tasks.get(channel.guild.id)
+    if started and not started[1].done():
+        try:
+            await asyncio.shield(started[1])
+        except Exception as e:
+            print(f"Daily update prefetch failed: {e}")
+
+    updates = [
+        prefetched_updates.pop((channel.guild.id, member.id))
+        for member in members
+    ]
+    missing = [
+        index for index, update in enumerate(updates) if update is None
+    ]
+    built = await build_daily_updates([members[index] for index in missing])
+    for index, update in zip(missing, built):
+        updates[index] = update
+
+    # Post in roster order so threads appear in the same order every day
+    for member, update in zip(members, updates):
+        if update is None:
+            continue
+        try:
+            await send_daily_update(member, channel, update)
+            print(f"Daily update triggered for {member.display_name}")
+        except Exception as e:
+            print(
+                f"Failed to trigger daily update for {member.display_name}: {e}"
+            )
 
 
 @bot.command(
@@ -770,6 +890,9 @@ async def add_user(ctx, username: str, authToken: str):
         })
         operation = "added"
 
+    invalidate_roster(guild_id)
+    invalidate_profile(guild_id)
+    reset_quorum_tracker(guild_id)
     await ctx.send(f"User {username} {operation} successfully.")
 
 
@@ -852,11 +975,11 @@ async def record_habit(ctx):
     finish_button = Button(label="Finish", style=discord.ButtonStyle.green)
 
     async def finish_callback(interaction):
-        # Create an embed with the user's habits
-        habit_embed = await create_habit_embed(user_id, database)
+        # Create embeds with the user's habits
+        habit_embeds = await create_habit_embeds(user_id)
         await interaction.response.send_message(
             "Here's your updated habit summary:",
-            embed=habit_embed,
+            embeds=habit_embeds[:10],
             ephemeral=True)
 
     finish_button.callback = finish_callback
@@ -866,13 +989,28 @@ async def record_habit(ctx):
                    view=view)
 
 
+@bot.command(name='recomputehabits',
+             help='Recalculate your habit streaks and momentum')
+async def recompute_habits(ctx):
+    try:
+        count = await recompute_habit_stats(ctx.author.id)
+    except Exception as e:
+        print(f"Error recomputing habit stats for {ctx.author.id}: {e}")
+        await ctx.send("Failed to recalculate your habits. Please try again later.")
+        return
+    if not count:
+        await ctx.send("You don't have any habits set up yet.")
+        return
+    await ctx.send(f"Recalculated streaks and momentum for {count} habit(s).")
+
+
 @bot.command(name='displayhabits', help='Display completed habits summary')
 async def display_habits(ctx):
     # Get the user's Discord ID
     user_id = ctx.author.id
 
-    # Get today's date and yesterday's date
-    today_date = datetime.now().date()
+    # Get today's date and yesterday's date in habit (Central) time
+    today_date = habit_today()
     yesterday_date = today_date - timedelta(days=1)
 
     # Fetch habits completed today and yesterday for the user
@@ -880,26 +1018,29 @@ async def display_habits(ctx):
     yesterday_habits = await fetch_completed_habits(user_id, yesterday_date)
 
     # Prepare the message
-    message = "**Habit Summary**\n-----------------\n"
+    lines = ["**Habit Summary**", "-----------------"]
 
     # Add completed habits for today
     if today_habits:
-        message += "**Completed Today:**\n"
-        for habit in today_habits:
-            message += f"{habit['title']} - Streak: {habit['streak']}, Overall Counter: {habit['overall_counter']}\n"
+        lines.append("**Completed Today:**")
+        lines.extend(
+            f"{habit['title']} - Streak: {habit['streak']}, Overall Counter: {habit['overall_counter']}"
+            for habit in today_habits)
     else:
-        message += "No habits completed today.\n"
+        lines.append("No habits completed today.")
 
     # Add completed habits for yesterday
     if yesterday_habits:
-        message += "\n**Completed Yesterday:**\n"
-        for habit in yesterday_habits:
-            message += f"{habit['title']} - Streak: {habit['streak']}, Overall Counter: {habit['overall_counter']}\n"
+        lines.append("")
+        lines.append("**Completed Yesterday:**")
+        lines.extend(
+            f"{habit['title']} - Streak: {habit['streak']}, Overall Counter: {habit['overall_counter']}"
+            for habit in yesterday_habits)
     else:
-        message += "No habits completed yesterday.\n"
+        lines.append("No habits completed yesterday.")
 
-    # Send the message
-    await ctx.send(message)
+    # Send the message, split into pages if needed
+    await send_paginated(ctx.channel, lines)
 
 
 @bot.command(name='discordid', help='Get the Discord ID of a mentioned user.')
@@ -958,19 +1099,14 @@ last_karma_updates = {}
 async def karma(ctx):
     guild = ctx.guild
 
-    # Fetch the monitored channel information from the database
-    guild_query = """
-        SELECT monitored_channel_name
-        FROM guilds
-        WHERE guild_id = :guild_id;
-    """
-    guild_info_result = await fetch_query(guild_query, {"guild_id": guild.id})
+    # Fetch the monitored channel information from the guild config cache
+    guild_info = await get_guild_config(guild.id)
 
-    if not guild_info_result:
+    if not guild_info:
         await ctx.send("Monitored channel not set for this guild.")
         return
 
-    monitored_channel_name = guild_info_result[0]['monitored_channel_name']
+    monitored_channel_name = guild_info['monitored_channel_name']
     monitored_channel = discord.utils.get(guild.voice_channels, name=monitored_channel_name)
 
     if not monitored_channel:
@@ -986,6 +1122,7 @@ async def karma(ctx):
         return
 
     all_users, present_users, absent_users = all_users_result
+    await get_roster(guild)
 
     # Store the changes in last_karma_updates
     last_karma_updates[guild.id] = {
@@ -994,7 +1131,7 @@ async def karma(ctx):
     }
 
     # Prepare the karma output
-    karma_output = "📊 **Karma Scores** 📊\n\n"
+    lines = ["📊 **Karma Scores** 📊", ""]
     insult_tasks = []
 
     for user in all_users:
@@ -1009,34 +1146,33 @@ async def karma(ctx):
             insult_tasks.append(get_insult(discord_id))
 
         karma_score = attendance - missed_standup
-        member = guild.get_member(discord_id)
-        username = member.display_name if member else f"User ID: {discord_id}"
-        karma_output += f"👤 **{username}**\n"
-        karma_output += f"- ✅ Attempted: {attendance}\n"
-        karma_output += f"- ❌ Missed: {missed_standup}\n"
-        karma_output += f"- ⚖️ Karma Score: {karma_score}\n\n"
+        username = roster_display_name(guild, discord_id)
+        lines.extend([
+            f"👤 **{username}**", f"- ✅ Attempted: {attendance}",
+            f"- ❌ Missed: {missed_standup}",
+            f"- ⚖️ Karma Score: {karma_score}", ""
+        ])
 
     insults = await asyncio.gather(*insult_tasks)
     for discord_id, insult in insults:
-        member = guild.get_member(discord_id)
-        username = member.display_name if member else f"User ID: {discord_id}"
-        karma_output += f"**{username}**, {insult}\n"
-
-    await ctx.send(karma_output)
-
+        username = roster_display_name(guild, discord_id)
+        lines.append(f"**{username}**, {insult}")
 
+    await send_paginated(ctx.channel, lines)
 
 
 async def get_insult(discord_id):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-                'https://evilinsult.com/generate_insult.php?lang=en&type=text'
-        ) as response:
-            if response.status == 200:
-                insult = await response.text()
-                return (discord_id, insult)
-            else:
-                return (discord_id, "You're absent, shame on you!")
+    async with get_session().get(service_url('insult',
+                                             '/generate_insult.php'),
+                                 params={
+                                     'lang': 'en',
+                                     'type': 'text'
+                                 }) as response:
+        if response.status == 200:
+            insult = await response.text()
+            return (discord_id, insult)
+        else:
+            return (discord_id, "You're absent, shame on you!")
 
 
 @bot.command(name='undokarma', help='Undo the last karma command')
@@ -1088,11 +1224,13 @@ async def karmascore(ctx):
         await ctx.send("No karma data found for this guild.")
         return
 
+    await get_roster(guild)
+
     # Prepare the karma output
-    karma_output = "📊 **Karma Scores for All Members** 📊\n\n"
-    karma_output += "```"
-    karma_output += "👤 User          | ✅ Attempted | ❌ Missed | ⚖️ Karma Score\n"
-    karma_output += "------------------------------------------------------------\n"
+    lines = [
+        "👤 User          | ✅ Attempted | ❌ Missed | ⚖️ Karma Score",
+        "------------------------------------------------------------"
+    ]
 
     for user in all_users:
         discord_id = user['discord_id']
@@ -1100,15 +1238,18 @@ async def karmascore(ctx):
         missed_standup = user['missed_standup']
         karma_score = attendance - missed_standup
 
-        member = guild.get_member(discord_id)
-        username = member.display_name if member else f"User ID: {discord_id}"
+        username = roster_display_name(guild, discord_id)
 
         # Format the output to align the columns
-        karma_output += f"{username:<15} | {attendance:<12} | {missed_standup:<9} | {karma_score:<12}\n"
-
-    karma_output += "```"
+        lines.append(
+            f"{username:<15} | {attendance:<12} | {missed_standup:<9} | {karma_score:<12}"
+        )
 
-    await ctx.send(karma_output)
+    # Every page keeps the table inside its own code block
+    title = send_scheduler.send(ctx.channel,
+                                "📊 **Karma Scores for All Members** 📊\n")
+    await send_paginated(ctx.channel, lines, prefix="```\n", suffix="\n```")
+    await title
 
 @bot.command(name='resetkarma', help='Reset karma metrics (attendance and missed standups) for all users')
 async def reset_karma(ctx):
@@ -1157,6 +1298,15 @@ async def hiatus(ctx, member: discord.Member):
         'guild_id': guild_id
     })
 
+    invalidate_roster(guild_id)
+    invalidate_profile(guild_id, user_id)
+    tracker = peek_quorum_tracker(guild_id)
+    if tracker:
+        guild_info = await get_guild_config(guild_id)
+        in_channel = bool(member.voice) and is_monitored_channel(
+            guild_info, member.voice.channel)
+        tracker.set_active(user_id, not new_status, present=in_channel)
+
     # Set the status message based on the new status
     status = "on hiatus" if new_status else "active"
 
@@ -1164,6 +1314,17 @@ async def hiatus(ctx, member: discord.Member):
     await ctx.send(f"User {member.display_name} is now {status}.")
 
 
+def queue_todoist_event(payload):
+    # Runs on a Flask worker thread; mirrors are only touched on the bot loop
+    try:
+        bot.loop.call_soon_threadsafe(apply_webhook_event, payload)
+    except (AttributeError, RuntimeError) as e:
+        print(f"Dropping Todoist event, bot loop not running: {e}")
+
+
+register_todoist_handler(queue_todoist_event)
+
+
 def run():
     app.run(host='0.0.0.0', port=8080)
 
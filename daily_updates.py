@@ -1,28 +1,18 @@
 # daily_updates.py
-import aiohttp
 import discord
 from discord.ext import commands
 from datetime import datetime, timedelta
 import pytz  # Ensure pytz is installed
-
-
-async def fetch_todoist_token(user_id, database):
-  # Assuming 'database' is an async database connection object
-  query = """
-    SELECT todoist_api_token
-    FROM users
-    WHERE discord_id = :user_id;
-    """
-  result = await database.fetch_one(query, {'user_id': user_id})
-  return result['todoist_api_token'] if result else None
+from http_client import get_session, service_url
+from profiles import load_profile
 
 
 async def fetch_tasks_from_todoist(todoist_token, filter):
   headers = {"Authorization": f"Bearer {todoist_token}"}
-  url = f"https://api.todoist.com/rest/v2/tasks?filter={filter}"
+  url = service_url('todoist_rest', "/tasks")
 
-  async with aiohttp.ClientSession() as session:
-    response = await session.get(url, headers=headers)
+  async with get_session().get(url, headers=headers,
+                               params={'filter': filter}) as response:
     if response.status == 200:
       tasks = await response.json()
       return [(task['content'], task.get('due', {}).get('date'))
@@ -34,8 +24,8 @@ async def fetch_tasks_from_todoist(todoist_token, filter):
       return []
 
 
-async def post_daily_update(bot, user_id, database):
-  user_info = await fetch_user_info(user_id, database)
+async def post_daily_update(bot, guild_id, user_id, database):
+  user_info = await load_profile(guild_id, user_id)
   if not user_info:
     return "Could not find your user information in the database."
 
@@ -48,9 +38,10 @@ async def post_daily_update(bot, user_id, database):
   if not channel:
     return f"Monitored text channel '{user_info['monitored_channel_name']}' not found in the associated guild."
 
-  thread = await get_or_create_thread(channel, user_info['discord_username'])
+  thread = await get_or_create_thread(channel, user_info['discord_username'],
+                                      user_id, database)
 
-  todoist_token = await fetch_todoist_token(user_id, database)
+  todoist_token = user_info['todoist_api_token']
   if todoist_token:
     tasks = await fetch_tasks_from_todoist(todoist_token, "today")
     message_content = "Your tasks for today:\n" + "\n".join(
@@ -62,35 +53,77 @@ async def post_daily_update(bot, user_id, database):
   return "Daily update posted successfully."
 
 
-async def fetch_user_info(user_id, database):
+# (channel_id, discord_id) -> thread_id
+_thread_ids = {}
+
+
+async def fetch_thread_id(channel, discord_id, database):
+  key = (channel.id, int(discord_id))
+  if key not in _thread_ids:
+    query = """
+      SELECT thread_id
+      FROM standup_threads
+      WHERE channel_id = :channel_id AND discord_id = :discord_id;
+      """
+    result = await database.fetch_one(query, {
+        'channel_id': channel.id,
+        'discord_id': int(discord_id)
+    })
+    _thread_ids[key] = result['thread_id'] if result else None
+  return _thread_ids[key]
+
+
+async def store_thread_id(channel, discord_id, thread_id, database):
   query = """
-    SELECT guild_id, discord_username, monitored_channel_name
-    FROM users
-    WHERE discord_id = :user_id
+    INSERT INTO standup_threads (channel_id, discord_id, guild_id, thread_id)
+    VALUES (:channel_id, :discord_id, :guild_id, :thread_id)
+    ON CONFLICT (channel_id, discord_id) DO UPDATE SET thread_id = :thread_id;
     """
-  result = await database.fetch_one(query, {'user_id': user_id})
-  if result:
-    return {
-        'guild_id': result['guild_id'],
-        'discord_username': result['discord_username'],
-        'monitored_channel_name': result['monitored_channel_name']
-    }
-  return None
-
-
-async def get_or_create_thread(channel, thread_name):
-  thread = discord.utils.find(
-      lambda t: t.name == thread_name and isinstance(t, discord.Thread),
-      channel.threads)
+  await database.execute(
+      query, {
+          'channel_id': channel.id,
+          'discord_id': int(discord_id),
+          'guild_id': channel.guild.id,
+          'thread_id': thread_id
+      })
+  _thread_ids[(channel.id, int(discord_id))] = thread_id
+
+
+async def resolve_thread(channel, thread_id):
+  thread = channel.guild.get_thread(thread_id)
+  if thread is None:
+    try:
+      thread = await channel.guild.fetch_channel(thread_id)
+    except (discord.NotFound, discord.Forbidden):
+      return None
+  if not isinstance(thread, discord.Thread):
+    return None
+  if thread.archived:
+    thread = await thread.edit(archived=False)
+  return thread
+
+
+async def get_or_create_thread(channel, thread_name, discord_id, database):
+  thread_id = await fetch_thread_id(channel, discord_id, database)
+  thread = await resolve_thread(channel, thread_id) if thread_id else None
+  if thread:
+    return thread
+
+  if not thread_id:
+    # Adopt an active thread created before thread ids were stored
+    thread = discord.utils.find(
+        lambda t: t.name == thread_name and isinstance(t, discord.Thread),
+        channel.threads)
   if not thread:
     thread = await channel.create_thread(
         name=thread_name, type=discord.ChannelType.public_thread)
+  await store_thread_id(channel, discord_id, thread.id, database)
   return thread
 
 
 async def fetch_completed_tasks_from_todoist(todoist_token):
   headers = {"Authorization": f"Bearer {todoist_token}"}
-  url = "https://api.todoist.com/sync/v9/completed/get_all"
+  url = service_url('todoist_sync', "/completed/get_all")
 
   # Time zone aware datetime for Central Time
   central_tz = pytz.timezone('America/Chicago')
@@ -104,8 +137,7 @@ async def fetch_completed_tasks_from_todoist(todoist_token):
   print("Yesterday for completed tasks (Central Time):", since_date)
   data = {"since": since_date}
 
-  async with aiohttp.ClientSession() as session:
-    response = await session.post(url, headers=headers, json=data)
+  async with get_session().post(url, headers=headers, json=data) as response:
     if response.status == 200:
       completed_tasks = await response.json()
       return completed_tasks.get('items', [])
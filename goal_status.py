@@ -0,0 +1,132 @@
+# goal_status.py
+import asyncio
+import os
+import time
+
+from beeminder import fetch_goal
+from guild_config import cached_guild_configs
+from http_client import get_session
+from roster import fetch_active_users
+
+GOAL_STATUS_REFRESH_SECONDS = float(
+    os.getenv('GOAL_STATUS_REFRESH_SECONDS', '600'))
+GOAL_STATUS_CONCURRENCY = int(os.getenv('GOAL_STATUS_CONCURRENCY', '8'))
+
+
+class GoalStatus:
+  __slots__ = ('beeminder_username', 'goal', 'safebuf', 'rate', 'runits',
+               'last_datapoint', 'updated_at', 'graph_url', 'etag',
+               'fetched_at')
+
+  def __init__(self, beeminder_username, goal):
+    self.beeminder_username = beeminder_username
+    self.goal = goal
+    self.safebuf = None
+    self.rate = None
+    self.runits = None
+    self.last_datapoint = None
+    self.updated_at = None
+    self.graph_url = None
+    self.etag = None
+    self.fetched_at = None
+
+  def apply(self, goal_json):
+    self.safebuf = goal_json.get('safebuf')
+    self.rate = goal_json.get('rate')
+    self.runits = goal_json.get('runits')
+    self.last_datapoint = goal_json.get('last_datapoint')
+    self.updated_at = goal_json.get('updated_at')
+    self.graph_url = goal_json.get('graph_url')
+
+
+# guild_id -> {beeminder_username: GoalStatus}
+_goal_statuses = {}
+
+
+def cached_goal_statuses(guild_id):
+  return _goal_statuses.get(int(guild_id), {})
+
+
+async def refresh_guild_goal_statuses(guild_id, goal, users=None):
+  if users is None:
+    users = await fetch_active_users(guild_id)
+  statuses = _goal_statuses.setdefault(int(guild_id), {})
+  semaphore = asyncio.Semaphore(GOAL_STATUS_CONCURRENCY)
+
+  async def refresh(user):
+    beeminder_username = user['beeminder_username']
+    status = statuses.get(beeminder_username)
+    if status is None or status.goal != goal:
+      status = GoalStatus(beeminder_username, goal)
+    async with semaphore:
+      try:
+        goal_json, etag = await fetch_goal(get_session(), beeminder_username,
+                                           user['beeminder_auth_token'], goal,
+                                           etag=status.etag)
+      except Exception as e:
+        print(f"Error refreshing goal status for {beeminder_username}: {e}")
+        return
+    if goal_json is not None:
+      status.apply(goal_json)
+    status.etag = etag
+    status.fetched_at = time.time()
+    statuses[beeminder_username] = status
+
+  await asyncio.gather(*(refresh(user) for user in users))
+  # Drop users that left the roster
+  active = {user['beeminder_username'] for user in users}
+  for beeminder_username in list(statuses):
+    if beeminder_username not in active:
+      del statuses[beeminder_username]
+
+
+class GoalStatusRefresher:
+  """Periodically refreshes goal statuses for every configured guild."""
+
+  def __init__(self, interval_seconds=GOAL_STATUS_REFRESH_SECONDS):
+    self.interval_seconds = interval_seconds
+    self._task = None
+    # guild_id -> goal awaiting an out-of-band refresh, and its worker task
+    self._pending = {}
+    self._guild_tasks = {}
+
+  def start(self):
+    if self._task is None or self._task.done():
+      self._task = asyncio.create_task(self._run())
+
+  def refresh_soon(self, guild_id, goal):
+    """Refreshes one guild now, outside the periodic cycle.
+
+    A call made while that guild's refresh is running queues one more pass,
+    so the result always reflects state as of the latest call.
+    """
+    guild_id = int(guild_id)
+    self._pending[guild_id] = goal
+    task = self._guild_tasks.get(guild_id)
+    if task is None or task.done():
+      self._guild_tasks[guild_id] = asyncio.create_task(
+          self._refresh_guild(guild_id))
+
+  async def _refresh_guild(self, guild_id):
+    while guild_id in self._pending:
+      goal = self._pending.pop(guild_id)
+      try:
+        await refresh_guild_goal_statuses(guild_id, goal)
+      except Exception as e:
+        print(f"Error refreshing goal statuses for guild {guild_id}: {e}")
+
+  async def _run(self):
+    while True:
+      configs = [config for config in cached_guild_configs() if config['goal']]
+      results = await asyncio.gather(*(refresh_guild_goal_statuses(
+          config['guild_id'], config['goal']) for config in configs),
+                                     return_exceptions=True)
+      for config, result in zip(configs, results):
+        if isinstance(result, Exception):
+          print(
+              f"Error refreshing goal statuses for guild {config['guild_id']}: {result}"
+          )
+      await asyncio.sleep(self.interval_seconds)
+
+
+goal_status_refresher = GoalStatusRefresher()
@@ -1,23 +1,22 @@
 import discord
 from discord.ui import Button, View, Modal, TextInput, Select
-import aiohttp
 from datetime import datetime
-
-MICROSERVICE_BASE_URL = "http://zarathu-env.eba-5kgszm3t.us-east-2.elasticbeanstalk.com"
+from http_client import get_session, service_url
+from render import send_paginated
 
 
 async def get_goals(discord_user_id):
-  url = f"{MICROSERVICE_BASE_URL}/goals/?user_id={discord_user_id}"
-  async with aiohttp.ClientSession() as session:
-    async with session.get(url) as response:
-      if response.status == 200:
-        return await response.json()
-      else:
-        error_message = await response.text()
-        return {
-            "error":
-            f"Failed to fetch goals. Status: {response.status}, Message: {error_message}"
-        }
+  url = service_url('goals', "/goals/")
+  async with get_session().get(url,
+                               params={'user_id': discord_user_id}) as response:
+    if response.status == 200:
+      return await response.json()
+    else:
+      error_message = await response.text()
+      return {
+          "error":
+          f"Failed to fetch goals. Status: {response.status}, Message: {error_message}"
+      }
 
 
 async def view_goals(ctx):
@@ -28,14 +27,16 @@ async def view_goals(ctx):
       await ctx.send(
           f"Sorry, I couldn't fetch your goals. Error: {goals['error']}")
     else:
-      response_message = "Your Goals:\n"
+      lines = ["Your Goals:"]
       for goal in goals:
-        response_message += f"- {goal['title']} ({goal['status']})\n" \
-                            f"  Description: {goal['description']}\n" \
-                            f"  Start Date: {goal['start_date']}\n" \
-                            f"  End Date: {goal['end_date']}\n" \
-                            f"  Category: {goal['category']}\n"
-      await ctx.send(response_message)
+        lines.extend([
+            f"- {goal['title']} ({goal['status']})",
+            f"  Description: {goal['description']}",
+            f"  Start Date: {goal['start_date']}",
+            f"  End Date: {goal['end_date']}",
+            f"  Category: {goal['category']}"
+        ])
+      await send_paginated(ctx.channel, lines)
   except Exception as e:
     await ctx.send(f"An error occurred: {e}")
 
@@ -89,12 +90,11 @@ class GoalModal(Modal):
             "user_id": discord_user_id
         }
 
-        url = f"{MICROSERVICE_BASE_URL}/goal/"
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=goal_data) as response:
-                if response.status in [200, 201]:
-                    result = await response.json()
-                    await interaction.response.send_message(f"Goal '{goal_title}' added successfully!")
-                else:
-                    error_message = await response.text()
-                    await interaction.response.send_message(f"Failed to add goal. Error: {error_message}")
+        url = service_url('goals', "/goal/")
+        async with get_session().post(url, json=goal_data) as response:
+            if response.status in [200, 201]:
+                result = await response.json()
+                await interaction.response.send_message(f"Goal '{goal_title}' added successfully!")
+            else:
+                error_message = await response.text()
+                await interaction.response.send_message(f"Failed to add goal. Error: {error_message}")
@@ -0,0 +1,97 @@
+# graph_cache.py
+import asyncio
+import contextlib
+import glob
+import os
+import tempfile
+
+from http_client import get_session, service_url
+
+GRAPH_CACHE_DIR = os.getenv('GRAPH_CACHE_DIR', '.cache/graphs')
+GRAPH_CONCURRENCY = int(os.getenv('GRAPH_CONCURRENCY', '8'))
+
+
+def _cache_path(beeminder_username, goal, updated_at):
+  return os.path.join(GRAPH_CACHE_DIR,
+                      f"{beeminder_username}-{goal}-{updated_at}.png")
+
+
+def _read_graph(path):
+  try:
+    with open(path, 'rb') as graph_file:
+      return graph_file.read()
+  except FileNotFoundError:
+    return None
+
+
+def _write_graph(path, data):
+  os.makedirs(GRAPH_CACHE_DIR, exist_ok=True)
+  # Older renders of the same graph are stale once a new one is stored.
+  # Overlapping !graphs calls may race to remove the same file.
+  prefix = path.rsplit('-', 1)[0]
+  for stale in glob.glob(f"{glob.escape(prefix)}-*.png"):
+    if stale != path:
+      with contextlib.suppress(FileNotFoundError):
+        os.remove(stale)
+  # Write then rename, so readers never see a partly written PNG
+  fd, tmp_path = tempfile.mkstemp(dir=GRAPH_CACHE_DIR, suffix='.tmp')
+  try:
+    with os.fdopen(fd, 'wb') as graph_file:
+      graph_file.write(data)
+    os.replace(tmp_path, path)
+  except BaseException:
+    with contextlib.suppress(FileNotFoundError):
+      os.remove(tmp_path)
+    raise
+
+
+async def fetch_graph(beeminder_username, goal, status=None):
+  """Returns the PNG bytes of a goal graph, or None if it can't be fetched.
+
+  Graphs are cached on disk keyed on the goal's `updated_at`, so they are
+  only downloaded again after the goal changes. Without a cached status
+  the graph is downloaded and not stored.
+  """
+  updated_at = status.updated_at if status else None
+  path = _cache_path(beeminder_username, goal, updated_at)
+  if updated_at:
+    # Disk I/O stays off the event loop, like the write below
+    data = await asyncio.to_thread(_read_graph, path)
+    if data is not None:
+      return data
+
+  url = status.graph_url if status and status.graph_url else service_url(
+      'beeminder_web', f"/{beeminder_username}/{goal}.png")
+  try:
+    async with get_session().get(url) as response:
+      if response.status != 200:
+        print(
+            f"Error fetching graph for {beeminder_username}: {response.status}"
+        )
+        return None
+      data = await response.read()
+  except Exception as e:
+    print(f"Exception fetching graph for {beeminder_username}: {e}")
+    return None
+
+  if updated_at:
+    try:
+      await asyncio.to_thread(_write_graph, path, data)
+    except OSError as e:
+      # The download is still good; only the cache write failed
+      print(f"Error caching graph for {beeminder_username}: {e}")
+  return data
+
+
+async def fetch_graphs(goal, beeminder_usernames, statuses):
+  """Fetches graphs concurrently; returns (username, png bytes) pairs in order."""
+  semaphore = asyncio.Semaphore(GRAPH_CONCURRENCY)
+
+  async def fetch(beeminder_username):
+    async with semaphore:
+      return await fetch_graph(beeminder_username, goal,
+                               statuses.get(beeminder_username))
+
+  graphs = await asyncio.gather(*(fetch(username)
+                                  for username in beeminder_usernames))
+  return list(zip(beeminder_usernames, graphs))
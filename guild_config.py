@@ -0,0 +1,89 @@
+# guild_config.py
+from database import database, fetch_query
+
+# guild_id -> config dict, or None for guilds that have no row in `guilds`.
+# Caching the miss as well keeps unconfigured guilds away from Postgres.
+_guild_configs = {}
+
+GUILD_CONFIG_QUERY = """
+    SELECT guild_id, goal, monitored_channel_id, monitored_channel_name, last_log_date
+    FROM guilds
+"""
+
+
+def _config_from_row(row):
+  return {
+      'guild_id': row['guild_id'],
+      'goal': row['goal'],
+      'monitored_channel_id': row['monitored_channel_id'],
+      'monitored_channel_name': row['monitored_channel_name'],
+      'last_log_date': row['last_log_date']
+  }
+
+
+async def warm_guild_configs():
+  rows = await fetch_query(GUILD_CONFIG_QUERY)
+  _guild_configs.clear()
+  for row in rows:
+    _guild_configs[int(row['guild_id'])] = _config_from_row(row)
+  print(f"Guild config cache warmed with {len(rows)} guilds.")
+
+
+async def get_guild_config(guild_id):
+  guild_id = int(guild_id)
+  if guild_id in _guild_configs:
+    return _guild_configs[guild_id]
+
+  # Errors propagate so a failed lookup is never cached as "no config"
+  rows = await database.fetch_all(
+      GUILD_CONFIG_QUERY + " WHERE guild_id = :guild_id",
+      {'guild_id': guild_id})
+  config = _config_from_row(rows[0]) if rows else None
+  _guild_configs[guild_id] = config
+  return config
+
+
+def cached_guild_configs():
+  return [config for config in _guild_configs.values() if config]
+
+
+def invalidate_guild_config(guild_id):
+  _guild_configs.pop(int(guild_id), None)
+
+
+def set_cached_last_log_date(guild_id, last_log_date):
+  config = _guild_configs.get(int(guild_id))
+  if config is not None:
+    config['last_log_date'] = last_log_date
+
+
+async def claim_standup_date(guild_id, today):
+  """Atomically claims `today` for logging; True for exactly one caller.
+
+  The conditional UPDATE is decided by Postgres row locking, so it is safe
+  across concurrent events and across several bot processes. Errors are
+  raised so a surrounding transaction rolls back.
+  """
+  query = """
+      UPDATE guilds
+      SET last_log_date = :today
+      WHERE guild_id = :guild_id
+        AND (last_log_date IS NULL OR last_log_date <> :today)
+      RETURNING guild_id;
+  """
+  claimed = await database.fetch_one(query, {
+      'guild_id': int(guild_id),
+      'today': today
+  })
+  # Either we own today or another caller does; the cache is current both ways
+  set_cached_last_log_date(guild_id, today)
+  return claimed is not None
+
+
+def is_monitored_channel(config, channel):
+  if not config or channel is None:
+    return False
+  if config['monitored_channel_id']:
+    return int(config['monitored_channel_id']) == channel.id
+  return bool(config['monitored_channel_name']) and \
+      channel.name == config['monitored_channel_name']
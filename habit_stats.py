@@ -0,0 +1,153 @@
+# habit_stats.py
+import asyncio
+import os
+from datetime import date
+from itertools import chain
+
+import aiocron
+import numpy as np
+import pytz
+
+from database import database
+from habits import HABIT_TIMEZONE, habit_today
+
+# Nightly, shortly after the Central-time day rolls over
+HABIT_STATS_CRON = os.getenv('HABIT_STATS_CRON', '15 0 * * *')
+
+EPOCH = date(1970, 1, 1)
+
+# Every habit with its completed days as ascending day numbers since EPOCH.
+# last_entry_date is read in the same snapshot so the write-back can skip
+# habits that were logged while the batch was computing.
+LOAD_QUERY = """
+    SELECT habits.id::text AS habit_id,
+           habits.last_entry_date,
+           array_agg(habit_daily_rollups.local_day - DATE '1970-01-01'
+                     ORDER BY habit_daily_rollups.local_day)
+             FILTER (WHERE habit_daily_rollups.local_day IS NOT NULL) AS days
+    FROM habits
+    LEFT JOIN habit_daily_rollups
+      ON habit_daily_rollups.user_id = habits.user_id
+      AND habit_daily_rollups.habit_id = habits.id::text
+    {where}
+    GROUP BY habits.id, habits.last_entry_date
+"""
+
+WRITE_QUERY = """
+    UPDATE habits SET
+        streak = stats.streak,
+        longest_streak = stats.longest_streak,
+        momentum_7 = stats.momentum_7,
+        momentum_30 = stats.momentum_30,
+        stats_updated_at = NOW()
+    FROM unnest(
+        CAST(:habit_ids AS TEXT[]),
+        CAST(:last_entry_dates AS DATE[]),
+        CAST(:streaks AS INTEGER[]),
+        CAST(:longest_streaks AS INTEGER[]),
+        CAST(:momentum_7 AS INTEGER[]),
+        CAST(:momentum_30 AS INTEGER[])
+    ) AS stats (habit_id, last_entry_date, streak, longest_streak,
+                momentum_7, momentum_30)
+    WHERE habits.id::text = stats.habit_id
+    AND habits.last_entry_date IS NOT DISTINCT FROM stats.last_entry_date
+"""
+
+
+def _momentum(habit, days, today, window, n_habits):
+  recent = (days > today - window) & (days <= today)
+  counts = np.bincount(habit[recent], minlength=n_habits)
+  return np.rint(counts * 100 / window).astype(np.int64)
+
+
+def compute_habit_stats(lengths, days, today):
+  """Computes streak stats for many habits at once.
+
+  `days` holds every habit's completed days back to back, as ascending,
+  distinct day numbers; `lengths[i]` is how many of them belong to habit i.
+  Returns (streak, longest_streak, momentum_7, momentum_30), one value per
+  habit. A streak is still current if its last day is today or yesterday.
+  """
+  n_habits = len(lengths)
+  habit = np.repeat(np.arange(n_habits), lengths)
+  streak = np.zeros(n_habits, dtype=np.int64)
+  longest_streak = np.zeros(n_habits, dtype=np.int64)
+  if len(days):
+    # A run of consecutive days starts at each habit's first day and after
+    # every gap
+    starts = np.ones(len(days), dtype=bool)
+    starts[1:] = (habit[1:] != habit[:-1]) | (np.diff(days) != 1)
+    run_start = np.flatnonzero(starts)
+    run_length = np.diff(np.append(run_start, len(days)))
+    run_habit = habit[run_start]
+    run_last_day = days[run_start + run_length - 1]
+
+    # Runs are ordered by habit, so each habit's runs are contiguous
+    habits_with_runs, first_run = np.unique(run_habit, return_index=True)
+    longest_streak[habits_with_runs] = np.maximum.reduceat(
+        run_length, first_run)
+    last_run = np.append(first_run[1:], len(run_start)) - 1
+    current = run_last_day[last_run] >= today - 1
+    streak[habits_with_runs] = np.where(current, run_length[last_run], 0)
+
+  return (streak, longest_streak, _momentum(habit, days, today, 7, n_habits),
+          _momentum(habit, days, today, 30, n_habits))
+
+
+async def recompute_habit_stats(user_id=None):
+  """Recomputes stored habit stats from the daily rollups in one pass.
+
+  Covers every habit, or only `user_id`'s. Returns the number of habits
+  processed.
+  """
+  where, values = '', {}
+  if user_id is not None:
+    where, values = 'WHERE habits.user_id = :user_id', {'user_id': str(user_id)}
+  rows = await database.fetch_all(LOAD_QUERY.format(where=where), values)
+  if not rows:
+    return 0
+
+  lengths = np.fromiter((len(row['days'] or ()) for row in rows),
+                        dtype=np.int64,
+                        count=len(rows))
+  days = np.fromiter(chain.from_iterable(row['days'] or () for row in rows),
+                     dtype=np.int64,
+                     count=int(lengths.sum()))
+  today = (habit_today() - EPOCH).days
+  streak, longest_streak, momentum_7, momentum_30 = await asyncio.to_thread(
+      compute_habit_stats, lengths, days, today)
+
+  await database.execute(WRITE_QUERY, {
+      'habit_ids': [row['habit_id'] for row in rows],
+      'last_entry_dates': [row['last_entry_date'] for row in rows],
+      'streaks': streak.tolist(),
+      'longest_streaks': longest_streak.tolist(),
+      'momentum_7': momentum_7.tolist(),
+      'momentum_30': momentum_30.tolist()
+  })
+  return len(rows)
+
+
+class HabitStatsSchedule:
+  """Runs the habit stats recompute nightly on a Central-time cron."""
+
+  def __init__(self, spec=HABIT_STATS_CRON):
+    self.spec = spec
+    self._job = None
+
+  def start(self):
+    # on_ready fires again on reconnect; only schedule once
+    if self._job is None:
+      self._job = aiocron.crontab(self.spec,
+                                  func=self._run,
+                                  tz=pytz.timezone(HABIT_TIMEZONE))
+
+  async def _run(self):
+    try:
+      count = await recompute_habit_stats()
+      print(f"Recomputed stats for {count} habits.")
+    except Exception as e:
+      print(f"Error recomputing habit stats: {e}")
+
+
+habit_stats_schedule = HabitStatsSchedule()
@@ -6,6 +6,13 @@ import asyncio
 import discord
 from discord.ui import Button, View, Modal, TextInput
 
+# Habit days, streaks and momentum are all bucketed in Central time
+HABIT_TIMEZONE = 'America/Chicago'
+
+
+def habit_today():
+  return datetime.now(pytz.timezone(HABIT_TIMEZONE)).date()
+
 
 async def fetch_user_habits(discord_id):
   query = """
@@ -15,15 +22,41 @@ async def fetch_user_habits(discord_id):
   """
   return await fetch_query(query, {'discord_id': str(discord_id)})
 
+async def fetch_habit_summaries(user_id):
+  # Each habit with the days it was completed in the last 7 days, in a single
+  # round-trip however many habits the user has
+  today = habit_today()
+  query = """
+      SELECT habits.id, habits.title, habits.streak, habits.overall_counter,
+             GREATEST(habits.longest_streak, habits.streak) AS longest_streak,
+             habits.momentum_30,
+             COUNT(habit_daily_rollups.local_day) AS completed_days
+      FROM habits
+      LEFT JOIN habit_daily_rollups
+        ON habit_daily_rollups.user_id = habits.user_id
+        AND habit_daily_rollups.habit_id = habits.id::text
+        AND habit_daily_rollups.local_day >= :start_day
+        AND habit_daily_rollups.local_day < :end_day
+      WHERE habits.user_id = :user_id
+      GROUP BY habits.id, habits.title, habits.streak, habits.overall_counter,
+               habits.longest_streak, habits.momentum_30
+      ORDER BY habits.title
+  """
+  return await fetch_query(query, {
+      'user_id': str(user_id),
+      'start_day': today - timedelta(days=6),  # Include today in the count
+      'end_day': today + timedelta(days=1)
+  })
+
 async def fetch_completed_habits(user_id, date):
   query = """
       SELECT title, 
              MAX(streak) AS streak, 
              MAX(overall_counter) AS overall_counter 
-      FROM habit_entries 
-      JOIN habits ON habit_entries.habit_id = habits.id 
-      WHERE habit_entries.user_id = :user_id 
-      AND DATE(habit_entries.entry_date) = :date 
+      FROM habit_daily_rollups 
+      JOIN habits ON habit_daily_rollups.habit_id = habits.id::text 
+      WHERE habit_daily_rollups.user_id = :user_id 
+      AND habit_daily_rollups.local_day = :date 
       GROUP BY title;
   """
   return await fetch_query(query, {'user_id': str(user_id), 'date': date})
@@ -31,75 +64,58 @@ async def generate_random_uuid():
     return str(uuid.uuid4())
 
 
-async def record_habit_entry(user_id, habit_id, quantity=None):
-  print(f"Starting to record habit entry for user {user_id} and habit {habit_id}")
+# Updates the streak and counter, inserts the entry and bumps the day's rollup
+# in one statement. The
+# UPDATE takes the habit's row lock, so concurrent clicks queue behind each
+# other and each sees the last_entry_date the previous one wrote.
+RECORD_HABIT_ENTRY_QUERY = """
+    WITH habit AS (
+        UPDATE habits SET
+            streak = CASE
+                WHEN last_entry_date = CAST(:entry_day AS DATE) THEN streak
+                WHEN last_entry_date = CAST(:entry_day AS DATE) - 1 THEN streak + 1
+                ELSE 1
+            END,
+            overall_counter = overall_counter + 1,
+            last_entry_date = CAST(:entry_day AS DATE)
+        WHERE id = :habit_id AND user_id = :user_id
+        RETURNING id, streak, overall_counter
+    ), entry AS (
+        INSERT INTO habit_entries (id, habit_id, entry_date, quantity, user_id)
+        SELECT :new_entry_id, id, :entry_date, :quantity, :user_id
+        FROM habit
+    ), rollup AS (
+        INSERT INTO habit_daily_rollups
+            (user_id, habit_id, local_day, entries, quantity)
+        SELECT :user_id, id::text, CAST(:entry_day AS DATE), 1, :quantity
+        FROM habit
+        ON CONFLICT (user_id, habit_id, local_day) DO UPDATE SET
+            entries = habit_daily_rollups.entries + 1,
+            quantity = habit_daily_rollups.quantity + EXCLUDED.quantity
+    )
+    SELECT streak, overall_counter FROM habit
+"""
 
+
+async def record_habit_entry(user_id, habit_id, quantity=None):
   central_tz = pytz.timezone('America/Chicago')
   entry_date = datetime.now(central_tz)
-  print(f"Entry date (Central Time): {entry_date}")
-
-  streak_update = await determine_streak_update(user_id, habit_id, entry_date)
-
-  # Update the streak and overall counter in the habits table
-  current_streak_query = """
-      SELECT streak, overall_counter FROM habits WHERE id = :habit_id
-  """
-  current_streak_data = await database.fetch_one(current_streak_query, {'habit_id': habit_id})
-  new_streak = current_streak_data['streak'] + 1 if streak_update == 1 else 1
-  new_overall_counter = current_streak_data['overall_counter'] + 1
-
-  streak_update_query = """
-      UPDATE habits SET 
-          streak = :new_streak, 
-          overall_counter = :new_overall_counter
-      WHERE id = :habit_id
-  """
-  await database.execute(streak_update_query, {
-      'new_streak': new_streak,
-      'new_overall_counter': new_overall_counter,
-      'habit_id': habit_id
-  })
-  print("Habit streak and overall counter updated.")
 
   new_entry_id = await generate_random_uuid()
-  insert_entry_query = """
-      INSERT INTO habit_entries (id, habit_id, entry_date, quantity, user_id)
-      VALUES (:new_entry_id, :habit_id, :entry_date, :quantity, :user_id)
-  """
   quantity_value = int(quantity) if quantity is not None else 1
-  await database.execute(insert_entry_query, {
+  result = await database.fetch_one(RECORD_HABIT_ENTRY_QUERY, {
+      'entry_day': entry_date.date(),
+      'entry_date': entry_date,
       'new_entry_id': new_entry_id,
       'habit_id': habit_id,
-      'entry_date': entry_date,
       'quantity': quantity_value,
-      'user_id': user_id
+      'user_id': str(user_id)
   })
-  print("New habit entry recorded.")
-
-
-async def determine_streak_update(user_id, habit_id, entry_date):
-  central_tz = pytz.timezone('America/Chicago')
-  entry_date = entry_date.astimezone(central_tz)
-
-  last_entry_query = """
-      SELECT entry_date FROM habit_entries
-      WHERE user_id = :user_id AND habit_id = :habit_id
-      ORDER BY entry_date DESC LIMIT 1
-  """
-  last_entry = await database.fetch_one(last_entry_query, {'user_id': user_id, 'habit_id': habit_id})
-  last_entry_date = last_entry['entry_date'].astimezone(central_tz) if last_entry else None
-
-  if last_entry_date is None:
-      return 1  # First entry for this habit
-
-  date_difference = (entry_date.date() - last_entry_date.date()).days
-  if date_difference == 0:
-      return 1  # Same day entry, no streak increase
-  elif date_difference == 1:
-      return 1  # Consecutive day entry, increase streak by 1
-  else:
-      return 0  # Gap of more than one day, reset streak to zero
-
+  if result is None:
+    raise LookupError(f"Habit {habit_id} not found for user {user_id}")
+  print(f"Recorded habit {habit_id} for user {user_id}: "
+        f"streak {result['streak']}, overall {result['overall_counter']}")
+  return result
 
 
 async def add_habit(ctx, habit_title):
@@ -147,62 +163,42 @@ async def delete_habit(ctx, habit_title):
 
     habit_id = habit_result[0]['id']
 
+    delete_rollups_query = """
+        DELETE FROM habit_daily_rollups
+        WHERE user_id = :user_id AND habit_id = :habit_id
+    """
     delete_entries_query = """
         DELETE FROM habit_entries
         WHERE habit_id = :habit_id
     """
-    try:
-        await execute_query(delete_entries_query, {'habit_id': habit_id})
-    except Exception as e:
-        print(f"Error deleting entries associated with habit: {e}")
-        await ctx.send("Failed to delete entries associated with the habit. Please try again later.")
-        return
-
     delete_habit_query = """
         DELETE FROM habits
         WHERE id = :habit_id
     """
 
+    # The rollups, entries and habit go together or not at all
     try:
-        await execute_query(delete_habit_query, {'habit_id': habit_id})
+        async with database.transaction():
+            await database.execute(delete_rollups_query, {
+                'user_id': user_id,
+                'habit_id': str(habit_id)
+            })
+            await database.execute(delete_entries_query, {'habit_id': habit_id})
+            await database.execute(delete_habit_query, {'habit_id': habit_id})
         await ctx.send(f"Habit '{habit_title}' deleted successfully!")
     except Exception as e:
         print(f"Error deleting habit: {e}")
         await ctx.send("Failed to delete the habit. Please try again later.")
 
 async def calculate_7_day_momentum(user_id, habit_id, database):
-    # Define the 7-day period
-    end_date = datetime.now().date()  # Today's date
-    start_date = end_date - timedelta(days=6)  # 7 days including today
-
-    # Fetch the completion records for the habit in the last 7 days
-    completions = await fetch_habit_completions(user_id, habit_id, start_date, end_date, database)
-
-    # Calculate momentum
-    if completions is not None:
-        momentum = (completions / 7) * 100  # As a percentage
-    else:
-        momentum = 0  # If no completions, momentum is 0%
-
-    return round(momentum)
-
-async def fetch_habit_completions(user_id, habit_id, start_date, end_date, database):
-# Query to count distinct days a habit was completed by the user in the last 7 days
-  query = """
-      SELECT COUNT(DISTINCT DATE(entry_date))
-      FROM habit_entries
-      WHERE user_id = :user_id
-      AND habit_id = :habit_id
-      AND entry_date::date BETWEEN :start_date AND :end_date
-  """
-  result = await database.fetch_one(query, {
-      'user_id': user_id,
-      'habit_id': habit_id,
-      'start_date': start_date,
-      'end_date': end_date
-  })
-  
-  if result and result[0]:
-      return result[0]  # Returns the count of distinct days with completions
-  return 0
-
+    # Momentum is kept on the habit by the habit_stats batch recompute
+    query = """
+        SELECT momentum_7
+        FROM habits
+        WHERE id = :habit_id AND user_id = :user_id
+    """
+    result = await database.fetch_one(query, {
+        'user_id': str(user_id),
+        'habit_id': habit_id
+    })
+    return result['momentum_7'] if result else 0
@@ -0,0 +1,44 @@
+# http_client.py
+import os
+
+import aiohttp
+
+SERVICE_BASE_URLS = {
+    'beeminder': "https://www.beeminder.com/api/v1",
+    'beeminder_web': "https://www.beeminder.com",
+    'todoist_rest': "https://api.todoist.com/rest/v2",
+    'todoist_sync': "https://api.todoist.com/sync/v9",
+    'goals': "http://zarathu-env.eba-5kgszm3t.us-east-2.elasticbeanstalk.com",
+    'insult': "https://evilinsult.com",
+}
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv('HTTP_TIMEOUT_SECONDS', '15'))
+HTTP_LIMIT_PER_HOST = int(os.getenv('HTTP_LIMIT_PER_HOST', '20'))
+
+# One long-lived session for every outbound call, created lazily inside the
+# bot's event loop and closed when the bot shuts down.
+_session = None
+
+
+def service_url(service, path=""):
+  return f"{SERVICE_BASE_URLS[service]}{path}"
+
+
+def get_session():
+  global _session
+  if _session is None or _session.closed:
+    connector = aiohttp.TCPConnector(limit=100,
+                                     limit_per_host=HTTP_LIMIT_PER_HOST,
+                                     ttl_dns_cache=300,
+                                     keepalive_timeout=60)
+    _session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS))
+  return _session
+
+
+async def close_session():
+  global _session
+  if _session is not None and not _session.closed:
+    await _session.close()
+  _session = None
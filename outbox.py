@@ -0,0 +1,364 @@
+# outbox.py
+import asyncio
+import os
+import uuid
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+from beeminder import BeeminderError, BeeminderRetryableError, create_datapoints, delete_datapoint
+from database import database
+from goal_status import goal_status_refresher
+from http_client import get_session
+
+BEEMINDER_CONCURRENCY = int(os.getenv('BEEMINDER_CONCURRENCY', '8'))
+OUTBOX_POLL_SECONDS = float(os.getenv('OUTBOX_POLL_SECONDS', '60'))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '200'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10'))
+
+ENQUEUE_QUERY = """
+    INSERT INTO beeminder_outbox
+        (request_id, guild_id, beeminder_username, goal, log_date, timestamp, value, comment)
+    VALUES
+        (:request_id, :guild_id, :beeminder_username, :goal, :log_date, :timestamp, :value, :comment)
+    ON CONFLICT (request_id) DO NOTHING;
+"""
+
+# Leases due rows by pushing next_attempt_at forward, so other bot processes
+# skip them while this one delivers. SKIP LOCKED keeps dispatchers from
+# waiting on each other.
+LEASE_QUERY = """
+    WITH leased AS (
+        UPDATE beeminder_outbox
+        SET next_attempt_at = NOW() + INTERVAL '5 minutes',
+            attempts = attempts + 1
+        WHERE request_id IN (
+            SELECT request_id FROM beeminder_outbox
+            WHERE status = 'pending' AND next_attempt_at <= NOW() {extra}
+            ORDER BY next_attempt_at
+            LIMIT :limit
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING *
+    )
+    SELECT leased.*, users.beeminder_auth_token
+    FROM leased
+    LEFT JOIN users
+        ON users.guild_id = leased.guild_id
+        AND users.beeminder_username = leased.beeminder_username
+    ORDER BY leased.beeminder_username, leased.goal, leased.timestamp;
+"""
+
+DELIVERED_QUERY = """
+    UPDATE beeminder_outbox
+    SET status = 'delivered', delivered_at = NOW(), last_error = NULL,
+        datapoint_id = :datapoint_id
+    WHERE request_id = :request_id;
+"""
+
+# Most recent delivered datapoint per active user, straight from the ledger
+LATEST_DELIVERED_QUERY = """
+    SELECT DISTINCT ON (o.beeminder_username)
+           o.request_id, o.beeminder_username, o.goal, o.datapoint_id,
+           users.beeminder_auth_token
+    FROM beeminder_outbox o
+    JOIN users
+        ON users.guild_id = o.guild_id
+        AND users.beeminder_username = o.beeminder_username
+    WHERE o.guild_id = :guild_id AND o.goal = :goal
+      AND o.status = 'delivered' AND o.datapoint_id IS NOT NULL
+      AND users.hiatus = FALSE
+    ORDER BY o.beeminder_username, o.timestamp DESC;
+"""
+
+REMOVED_QUERY = """
+    UPDATE beeminder_outbox SET status = 'removed'
+    WHERE request_id = :request_id;
+"""
+
+RETRY_QUERY = """
+    UPDATE beeminder_outbox
+    SET status = CASE WHEN :retryable AND attempts < :max_attempts
+                      THEN 'pending' ELSE 'failed' END,
+        next_attempt_at = NOW() + LEAST(POWER(2, attempts) * 30, 3600) * INTERVAL '1 second',
+        last_error = :error
+    WHERE request_id = :request_id;
+"""
+
+
+def standup_request_id(guild_id, beeminder_username, goal, log_date):
+  return f"standup-{guild_id}-{beeminder_username}-{goal}-{log_date}"
+
+
+async def enqueue_datapoints(guild_id, goal, users, log_date, timestamp,
+                             comment='logged via discord bot',
+                             request_ids=None):
+  """Writes one outbox row per user and returns their request ids.
+
+  Call inside a transaction to make the rows atomic with other writes.
+  Without `request_ids`, each row gets a fresh unique id.
+  """
+  if request_ids is None:
+    request_ids = [f"manual-{uuid.uuid4()}" for _ in users]
+  values = [{
+      'request_id': request_id,
+      'guild_id': int(guild_id),
+      'beeminder_username': user['beeminder_username'],
+      'goal': goal,
+      'log_date': log_date,
+      'timestamp': timestamp,
+      'value': 1,
+      'comment': comment
+  } for request_id, user in zip(request_ids, users)]
+  if values:
+    await database.execute_many(ENQUEUE_QUERY, values)
+  return request_ids
+
+
+async def enqueue_standup(guild_id, goal, users, log_date, timestamp):
+  request_ids = [
+      standup_request_id(guild_id, user['beeminder_username'], goal, log_date)
+      for user in users
+  ]
+  return await enqueue_datapoints(guild_id, goal, users, log_date, timestamp,
+                                  request_ids=request_ids)
+
+
+LEDGER_DAYS_QUERY = """
+    SELECT beeminder_username, log_date
+    FROM beeminder_outbox
+    WHERE guild_id = :guild_id AND goal = :goal AND log_date >= :start_date
+      AND status IN ('pending', 'delivered');
+"""
+
+
+def missing_standup_days(today, max_days):
+  """Candidate days to backfill: the `max_days` days before `today`.
+
+  The guild's last_log_date can't bound this, since it is usually today by
+  the time anyone notices a gap; plan_backfill's ledger check decides which
+  days were actually missed.
+  """
+  start = today - timedelta(days=max_days)
+  return [start + timedelta(days=offset) for offset in range(max_days)]
+
+
+async def plan_backfill(guild_id, goal, users, days):
+  """Maps each Beeminder username to the days it has no datapoint for.
+
+  The outbox ledger acts as per-user attendance, so users who were logged
+  on a day (for example by !logstandups) are not logged again.
+  """
+  if not days:
+    return {}
+  rows = await database.fetch_all(LEDGER_DAYS_QUERY, {
+      'guild_id': int(guild_id),
+      'goal': goal,
+      'start_date': days[0]
+  })
+  logged = {(row['beeminder_username'], row['log_date']) for row in rows}
+  plan = {}
+  for user in users:
+    beeminder_username = user['beeminder_username']
+    missing = [day for day in days if (beeminder_username, day) not in logged]
+    if missing:
+      plan[beeminder_username] = missing
+  return plan
+
+
+# Backfilled days may already have a failed or removed row under the same
+# request id; those are put back in the queue rather than skipped.
+BACKFILL_QUERY = """
+    INSERT INTO beeminder_outbox
+        (request_id, guild_id, beeminder_username, goal, log_date, timestamp, value, comment)
+    VALUES
+        (:request_id, :guild_id, :beeminder_username, :goal, :log_date, :timestamp, :value, :comment)
+    ON CONFLICT (request_id) DO UPDATE SET
+        status = 'pending', attempts = 0, next_attempt_at = NOW(),
+        last_error = NULL, delivered_at = NULL, datapoint_id = NULL,
+        timestamp = EXCLUDED.timestamp, comment = EXCLUDED.comment
+    WHERE beeminder_outbox.status IN ('failed', 'removed');
+"""
+
+
+async def enqueue_backfill(guild_id, goal, plan, tz):
+  """Queues the planned days, timestamped at noon local time on each day."""
+  values = []
+  for beeminder_username, days in plan.items():
+    for day in days:
+      timestamp = tz.localize(datetime.combine(day, time(12))).timestamp()
+      values.append({
+          'request_id': standup_request_id(guild_id, beeminder_username, goal,
+                                           day),
+          'guild_id': int(guild_id),
+          'beeminder_username': beeminder_username,
+          'goal': goal,
+          'log_date': day,
+          'timestamp': int(timestamp),
+          'value': 1,
+          'comment': 'backfilled via discord bot'
+      })
+  if values:
+    await database.execute_many(BACKFILL_QUERY, values)
+  return [value['request_id'] for value in values]
+
+
+class BeeminderOutbox:
+  """Background dispatcher that delivers outbox rows to Beeminder.
+
+  Rows are grouped per Beeminder user and goal into one create_all request,
+  and groups are delivered concurrently under BEEMINDER_CONCURRENCY.
+  """
+
+  def __init__(self, poll_seconds=OUTBOX_POLL_SECONDS):
+    self.poll_seconds = poll_seconds
+    self._wake = asyncio.Event()
+    self._task = None
+
+  def start(self):
+    if self._task is None or self._task.done():
+      self._task = asyncio.create_task(self._run())
+
+  def wake(self):
+    self._wake.set()
+
+  async def _run(self):
+    while True:
+      self._wake.clear()
+      try:
+        results = await self.dispatch()
+      except Exception as e:
+        print(f"Error dispatching Beeminder outbox: {e}")
+        results = []
+      # A full batch means more rows may be due right away
+      if len(results) >= OUTBOX_BATCH_SIZE:
+        continue
+      try:
+        await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+      except asyncio.TimeoutError:
+        pass
+
+  async def dispatch(self, request_ids=None):
+    """Delivers due rows, or only `request_ids`, and returns per-row results."""
+    if request_ids is not None:
+      if not request_ids:
+        return []
+      query = LEASE_QUERY.format(extra="AND request_id = ANY(:request_ids)")
+      values = {'limit': len(request_ids), 'request_ids': list(request_ids)}
+    else:
+      query = LEASE_QUERY.format(extra="")
+      values = {'limit': OUTBOX_BATCH_SIZE}
+    rows = await database.fetch_all(query, values)
+    if not rows:
+      return []
+
+    semaphore = asyncio.Semaphore(BEEMINDER_CONCURRENCY)
+    groups = [
+        list(group) for _, group in groupby(
+            rows, key=lambda row: (row['beeminder_username'], row['goal']))
+    ]
+
+    async def deliver(group):
+      async with semaphore:
+        return await self._deliver_group(group)
+
+    group_results = await asyncio.gather(*(deliver(group) for group in groups))
+    results = [result for group in group_results for result in group]
+
+    delivered = [{
+        'request_id': r['request_id'],
+        'datapoint_id': r['datapoint_id']
+    } for r in results if r['ok']]
+    if delivered:
+      await database.execute_many(DELIVERED_QUERY, delivered)
+      # Pick up the new datapoints so cached statuses and graphs move on
+      for guild_id, goal in {(r['guild_id'], r['goal'])
+                             for r in results if r['ok']}:
+        goal_status_refresher.refresh_soon(guild_id, goal)
+    failed = [{
+        'request_id': r['request_id'],
+        'retryable': r['retryable'],
+        'max_attempts': OUTBOX_MAX_ATTEMPTS,
+        'error': r['error']
+    } for r in results if not r['ok']]
+    if failed:
+      await database.execute_many(RETRY_QUERY, failed)
+      print(f"Beeminder outbox: {len(failed)} datapoints not delivered.")
+    return results
+
+  async def _deliver_group(self, rows):
+    beeminder_username = rows[0]['beeminder_username']
+    auth_token = rows[0]['beeminder_auth_token']
+    error, retryable = None, True
+    datapoint_ids = {}
+    if not auth_token:
+      error, retryable = "No Beeminder auth token on record", False
+    else:
+      datapoints = [{
+          'timestamp': row['timestamp'],
+          'value': float(row['value']),
+          'comment': row['comment'],
+          'requestid': row['request_id']
+      } for row in rows]
+      try:
+        created = await create_datapoints(get_session(), beeminder_username,
+                                          auth_token, rows[0]['goal'],
+                                          datapoints)
+        datapoint_ids = {
+            datapoint.get('requestid'): str(datapoint['id'])
+            for datapoint in created
+        }
+      except BeeminderRetryableError as e:
+        error = str(e)
+      except BeeminderError as e:
+        error, retryable = str(e), False
+      except Exception as e:
+        error = f"Exception: {str(e)}"
+
+    return [{
+        'request_id': row['request_id'],
+        'guild_id': row['guild_id'],
+        'goal': row['goal'],
+        'beeminder_username': beeminder_username,
+        'ok': error is None,
+        'retryable': retryable,
+        'datapoint_id': datapoint_ids.get(row['request_id']),
+        'error': error
+    } for row in rows]
+
+
+async def remove_latest_standups(guild_id, goal):
+  """Deletes each active user's latest delivered datapoint, concurrently.
+
+  Datapoint ids come from the outbox ledger, so no datapoint lists are
+  downloaded. Returns one result dict per deleted datapoint.
+  """
+  rows = await database.fetch_all(LATEST_DELIVERED_QUERY, {
+      'guild_id': int(guild_id),
+      'goal': goal
+  })
+  semaphore = asyncio.Semaphore(BEEMINDER_CONCURRENCY)
+
+  async def remove(row):
+    error = None
+    async with semaphore:
+      try:
+        await delete_datapoint(get_session(), row['beeminder_username'],
+                               row['beeminder_auth_token'], goal,
+                               row['datapoint_id'])
+      except Exception as e:
+        error = str(e)
+    return {
+        'request_id': row['request_id'],
+        'beeminder_username': row['beeminder_username'],
+        'ok': error is None,
+        'error': error
+    }
+
+  results = await asyncio.gather(*(remove(row) for row in rows))
+  removed = [{'request_id': r['request_id']} for r in results if r['ok']]
+  if removed:
+    await database.execute_many(REMOVED_QUERY, removed)
+  return results
+
+
+beeminder_outbox = BeeminderOutbox()
@@ -0,0 +1,40 @@
+# profiles.py
+import os
+
+from database import database
+from ttl_cache import TTLCache
+
+PROFILE_TTL_SECONDS = float(os.getenv('PROFILE_TTL_SECONDS', '60'))
+
+PROFILE_QUERY = """
+    SELECT guild_id, discord_id, discord_username, monitored_channel_name,
+           beeminder_username, beeminder_auth_token, todoist_api_token,
+           primary_phone, secondary_phone, email,
+           hiatus, daily_updates, attendance, missed_standup
+    FROM users
+    WHERE guild_id = :guild_id AND discord_id = :discord_id;
+"""
+
+# (guild_id, discord_id) -> profile dict, or False for users not on record
+_profiles = TTLCache(PROFILE_TTL_SECONDS)
+
+
+async def load_profile(guild_id, discord_id):
+  """Returns every users field for one member in a single query, or None."""
+  key = (int(guild_id), int(discord_id))
+  profile = _profiles.get(key)
+  if profile is None:
+    result = await database.fetch_one(PROFILE_QUERY, {
+        'guild_id': key[0],
+        'discord_id': key[1]
+    })
+    profile = dict(result) if result else False
+    _profiles.set(key, profile)
+  return profile or None
+
+
+def invalidate_profile(guild_id, discord_id=None):
+  if discord_id is not None:
+    _profiles.pop((int(guild_id), int(discord_id)))
+  else:
+    _profiles.invalidate(lambda key: key[0] == int(guild_id))
@@ -0,0 +1,88 @@
+# quorum.py
+from roster import get_roster
+
+
+class QuorumTracker:
+  """Tracks which active roster members are present in the standup channel.
+
+  Joins and leaves are applied as deltas, so checking whether everyone is
+  here costs O(1) per voice event. Non-registered people in the channel
+  are ignored.
+  """
+  __slots__ = ('active_ids', 'present_ids', 'fired_on')
+
+  def __init__(self, active_ids, present_ids):
+    self.active_ids = set(active_ids)
+    self.present_ids = self.active_ids & set(present_ids)
+    self.fired_on = None
+
+  def join(self, discord_id):
+    if discord_id in self.active_ids:
+      self.present_ids.add(discord_id)
+
+  def leave(self, discord_id):
+    self.present_ids.discard(discord_id)
+
+  def set_active(self, discord_id, active, present=False):
+    if active:
+      self.active_ids.add(discord_id)
+      if present:
+        self.present_ids.add(discord_id)
+    else:
+      self.active_ids.discard(discord_id)
+      self.present_ids.discard(discord_id)
+
+  def sync_present(self, member_ids):
+    """Re-reads presence from the channel's current members.
+
+    Voice updates missed across a gateway reconnect are never replayed, so
+    the deltas alone can drift from who is really in the channel.
+    """
+    self.present_ids = self.active_ids & set(member_ids)
+
+  @property
+  def complete(self):
+    return bool(self.active_ids) and \
+        len(self.present_ids) == len(self.active_ids)
+
+  def try_fire(self, today):
+    """Returns True exactly once per day, when the quorum is complete."""
+    if not self.complete or self.fired_on == today:
+      return False
+    self.fired_on = today
+    return True
+
+  def rearm(self, today):
+    """Undoes try_fire for `today` after the standup failed to go out."""
+    if self.fired_on == today:
+      self.fired_on = None
+
+
+# guild_id -> QuorumTracker
+_trackers = {}
+
+
+async def get_quorum_tracker(guild, voice_channel):
+  tracker = _trackers.get(guild.id)
+  if tracker is None:
+    roster = await get_roster(guild)
+    # Registered users who left the guild or couldn't be resolved can never
+    # join the channel, so they don't count toward the quorum
+    tracker = QuorumTracker([
+        discord_id for discord_id, entry in roster.items() if entry.member
+    ],
+                            [member.id for member in voice_channel.members])
+    _trackers[guild.id] = tracker
+  return tracker
+
+
+def peek_quorum_tracker(guild_id):
+  return _trackers.get(int(guild_id))
+
+
+def reset_quorum_tracker(guild_id):
+  _trackers.pop(int(guild_id), None)
+
+
+def reset_all_quorum_trackers():
+  _trackers.clear()
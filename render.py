@@ -0,0 +1,62 @@
+# render.py
+from discord import Embed
+
+from send_scheduler import MAX_CONTENT_LENGTH, send_scheduler
+
+MAX_EMBED_FIELDS = 25
+MAX_EMBED_CHARACTERS = 6000
+
+
+def paginate(lines, limit=MAX_CONTENT_LENGTH, prefix='', suffix=''):
+  """Yields pages of at most `limit` characters, split at line boundaries.
+
+  Lines are consumed in a single pass. `prefix` and `suffix` wrap every
+  page, e.g. to keep a code block open across pages. A single line longer
+  than a page is hard-split.
+  """
+  room = limit - len(prefix) - len(suffix)
+  page, size = [], 0
+  for line in lines:
+    while len(line) > room:
+      if page:
+        yield prefix + '\n'.join(page) + suffix
+        page, size = [], 0
+      yield prefix + line[:room] + suffix
+      line = line[room:]
+    # +1 for the newline joining this line to the page
+    added = len(line) + (1 if page else 0)
+    if size + added > room:
+      yield prefix + '\n'.join(page) + suffix
+      page, size, added = [], 0, len(line)
+    page.append(line)
+    size += added
+  if page:
+    yield prefix + '\n'.join(page) + suffix
+
+
+async def send_paginated(channel, lines, prefix='', suffix=''):
+  pages = [
+      send_scheduler.send(channel, page)
+      for page in paginate(lines, prefix=prefix, suffix=suffix)
+  ]
+  for page in pages:
+    await page
+
+
+def paginate_fields(fields, title, color=None, description=None):
+  """Builds as many embeds as needed for (name, value, inline) fields."""
+  embeds = []
+  embed, size = None, 0
+  for name, value, inline in fields:
+    added = len(name) + len(value)
+    if embed is None or len(embed.fields) >= MAX_EMBED_FIELDS or \
+        size + added > MAX_EMBED_CHARACTERS:
+      embed = Embed(title=title if not embeds else f"{title} (cont.)",
+                    color=color)
+      embeds.append(embed)
+      size = len(embed.title)
+    embed.add_field(name=name, value=value, inline=inline)
+    size += added
+  if not embeds:
+    embeds.append(Embed(title=title, color=color, description=description))
+  return embeds
@@ -0,0 +1,96 @@
+# roster.py
+from database import database, fetch_query
+
+
+class RosterEntry:
+  __slots__ = ('discord_id', 'beeminder_username', 'beeminder_auth_token',
+               'member')
+
+  def __init__(self, discord_id, beeminder_username, beeminder_auth_token,
+               member=None):
+    self.discord_id = discord_id
+    self.beeminder_username = beeminder_username
+    self.beeminder_auth_token = beeminder_auth_token
+    self.member = member
+
+
+# guild_id -> {discord_id: RosterEntry} for registered, non-hiatus users
+_rosters = {}
+
+
+ACTIVE_USERS_QUERY = """
+    SELECT discord_id, beeminder_username, beeminder_auth_token, attendance, missed_standup
+    FROM users
+    WHERE guild_id = :guild_id AND hiatus = FALSE
+    ORDER BY discord_id;
+"""
+
+
+async def fetch_active_users(guild_id):
+  return await fetch_query(ACTIVE_USERS_QUERY, {'guild_id': guild_id})
+
+
+async def load_roster(guild):
+  # Errors propagate so a failed load is never cached as an empty roster
+  users = await database.fetch_all(ACTIVE_USERS_QUERY, {'guild_id': guild.id})
+  roster = {}
+  unresolved = []
+  for user in users:
+    discord_id = user['discord_id']
+    if discord_id is None:
+      continue
+    discord_id = int(discord_id)
+    member = guild.get_member(discord_id)
+    roster[discord_id] = RosterEntry(discord_id, user['beeminder_username'],
+                                     user['beeminder_auth_token'], member)
+    if member is None:
+      unresolved.append(discord_id)
+
+  # Members missing from the cache are requested over the gateway in chunks
+  # of 100 rather than one REST fetch_member call per user.
+  for start in range(0, len(unresolved), 100):
+    try:
+      members = await guild.query_members(user_ids=unresolved[start:start + 100],
+                                          cache=True)
+    except Exception as e:
+      print(f"Error querying roster members for guild {guild.id}: {e}")
+      continue
+    for member in members:
+      roster[member.id].member = member
+
+  _rosters[guild.id] = roster
+  print(f"Roster loaded for guild {guild.id}: {len(roster)} active users.")
+  return roster
+
+
+async def get_roster(guild):
+  roster = _rosters.get(guild.id)
+  if roster is None:
+    roster = await load_roster(guild)
+  return roster
+
+
+def invalidate_roster(guild_id):
+  _rosters.pop(int(guild_id), None)
+
+
+def update_roster_member(member):
+  entry = _rosters.get(member.guild.id, {}).get(member.id)
+  if entry is not None:
+    entry.member = member
+
+
+def remove_roster_member(member):
+  entry = _rosters.get(member.guild.id, {}).get(member.id)
+  if entry is not None:
+    entry.member = None
+
+
+def active_members(roster):
+  return [entry.member for entry in roster.values() if entry.member]
+
+
+def roster_display_name(guild, discord_id):
+  entry = _rosters.get(guild.id, {}).get(int(discord_id))
+  member = entry.member if entry else guild.get_member(int(discord_id))
+  return member.display_name if member else f"User ID: {discord_id}"
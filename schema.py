@@ -0,0 +1,108 @@
+# schema.py
+from database import database
+
+# Tables owned by the bot itself. Every statement is idempotent and runs on
+# each startup, so new deployments and existing databases converge.
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS beeminder_outbox (
+        request_id TEXT PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        beeminder_username TEXT NOT NULL,
+        goal TEXT NOT NULL,
+        log_date DATE NOT NULL,
+        timestamp BIGINT NOT NULL,
+        value NUMERIC NOT NULL DEFAULT 1,
+        comment TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        last_error TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        delivered_at TIMESTAMPTZ
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS beeminder_outbox_pending_idx
+    ON beeminder_outbox (next_attempt_at)
+    WHERE status = 'pending'
+    """,
+    """
+    ALTER TABLE beeminder_outbox ADD COLUMN IF NOT EXISTS datapoint_id TEXT
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS beeminder_outbox_ledger_idx
+    ON beeminder_outbox (guild_id, goal, beeminder_username, timestamp DESC)
+    WHERE status = 'delivered'
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS standup_threads (
+        channel_id BIGINT NOT NULL,
+        discord_id BIGINT NOT NULL,
+        guild_id BIGINT NOT NULL,
+        thread_id BIGINT NOT NULL,
+        PRIMARY KEY (channel_id, discord_id)
+    )
+    """,
+    # Add last_entry_date and seed it from existing entries, once: the seed
+    # only runs in the same step that creates the column
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'habits' AND column_name = 'last_entry_date'
+        ) THEN
+            ALTER TABLE habits ADD COLUMN last_entry_date DATE;
+            UPDATE habits SET last_entry_date = latest.entry_day
+            FROM (
+                SELECT habit_id,
+                       MAX((entry_date AT TIME ZONE 'America/Chicago')::date) AS entry_day
+                FROM habit_entries
+                GROUP BY habit_id
+            ) AS latest
+            WHERE habits.id = latest.habit_id;
+        END IF;
+    END
+    $$
+    """,
+    # One row per habit per Central-time day, kept current by
+    # record_habit_entry so reads never aggregate raw habit_entries
+    """
+    CREATE TABLE IF NOT EXISTS habit_daily_rollups (
+        user_id TEXT NOT NULL,
+        habit_id TEXT NOT NULL,
+        local_day DATE NOT NULL,
+        entries INTEGER NOT NULL DEFAULT 0,
+        quantity BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, habit_id, local_day)
+    )
+    """,
+    # Build the rollups from existing entries the first time the table exists
+    """
+    INSERT INTO habit_daily_rollups
+        (user_id, habit_id, local_day, entries, quantity)
+    SELECT user_id, habit_id::text,
+           (entry_date AT TIME ZONE 'America/Chicago')::date,
+           COUNT(*), SUM(COALESCE(quantity, 1))
+    FROM habit_entries
+    WHERE NOT EXISTS (SELECT 1 FROM habit_daily_rollups)
+    GROUP BY 1, 2, 3
+    ON CONFLICT DO NOTHING
+    """,
+    # Written by the habit_stats batch recompute
+    """
+    ALTER TABLE habits
+        ADD COLUMN IF NOT EXISTS longest_streak INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS momentum_7 INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS momentum_30 INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS stats_updated_at TIMESTAMPTZ
+    """,
+]
+
+
+async def ensure_schema():
+  for statement in SCHEMA_STATEMENTS:
+    await database.execute(statement)
+  print("Database schema is up to date.")
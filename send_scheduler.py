@@ -0,0 +1,125 @@
+# send_scheduler.py
+import asyncio
+import os
+import time
+
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBEDS = 10
+MAX_EMBED_CHARACTERS = 6000
+
+# Discord allows 5 messages per 5 seconds per channel
+CHANNEL_MESSAGES_PER_WINDOW = int(os.getenv('CHANNEL_MESSAGES_PER_WINDOW', '5'))
+CHANNEL_WINDOW_SECONDS = float(os.getenv('CHANNEL_WINDOW_SECONDS', '5'))
+# A channel's worker and state are dropped after this long with nothing queued
+CHANNEL_IDLE_SECONDS = float(os.getenv('CHANNEL_IDLE_SECONDS', '60'))
+
+
+class _Outgoing:
+  __slots__ = ('content', 'embeds', 'files', 'future')
+
+  def __init__(self, content, embeds, files, future):
+    self.content = content
+    self.embeds = embeds
+    self.files = files
+    self.future = future
+
+
+def _fits(batch, item):
+  if batch[0].files or item.files:
+    return False
+  contents = [part.content for part in batch if part.content]
+  if item.content:
+    contents.append(item.content)
+  if len('\n'.join(contents)) > MAX_CONTENT_LENGTH:
+    return False
+  embeds = [embed for part in batch for embed in part.embeds] + item.embeds
+  return len(embeds) <= MAX_EMBEDS and \
+      sum(len(embed) for embed in embeds) <= MAX_EMBED_CHARACTERS
+
+
+def coalesce(items):
+  """Greedily merges queued sends, in order, into as few messages as fit."""
+  batches = []
+  for item in items:
+    if batches and _fits(batches[-1], item):
+      batches[-1].append(item)
+    else:
+      batches.append([item])
+  return batches
+
+
+class SendScheduler:
+  """Queues outbound messages per channel and sends them in merged batches.
+
+  Each channel has one worker that coalesces whatever is queued into the
+  fewest messages Discord allows and paces sends to the per-channel rate
+  limit, so bursts don't end in 429 stalls. Workers exit once their
+  channel has been idle for CHANNEL_IDLE_SECONDS.
+  """
+
+  def __init__(self):
+    self._queues = {}
+    self._workers = {}
+    self._sent_at = {}
+
+  def send(self, channel, content=None, embeds=None, files=None):
+    """Queues a message; returns a future for the Message it went out in."""
+    future = asyncio.get_running_loop().create_future()
+    item = _Outgoing(content, list(embeds or []), list(files or []), future)
+    queue = self._queues.setdefault(channel.id, asyncio.Queue())
+    worker = self._workers.get(channel.id)
+    if worker is None or worker.done():
+      self._workers[channel.id] = asyncio.create_task(
+          self._drain(channel, queue))
+    queue.put_nowait(item)
+    return future
+
+  async def _wait_for_slot(self, channel_id):
+    sent_at = self._sent_at.setdefault(channel_id, [])
+    now = time.monotonic()
+    sent_at[:] = [at for at in sent_at if now - at < CHANNEL_WINDOW_SECONDS]
+    if len(sent_at) >= CHANNEL_MESSAGES_PER_WINDOW:
+      await asyncio.sleep(CHANNEL_WINDOW_SECONDS - (now - sent_at[0]))
+      sent_at.pop(0)
+    sent_at.append(time.monotonic())
+
+  async def _drain(self, channel, queue):
+    while True:
+      try:
+        item = await asyncio.wait_for(queue.get(), CHANNEL_IDLE_SECONDS)
+      except asyncio.TimeoutError:
+        if queue.empty():
+          # Nothing can be queued between this check and the return, so
+          # the next send() starts a fresh worker
+          self._queues.pop(channel.id, None)
+          self._workers.pop(channel.id, None)
+          self._sent_at.pop(channel.id, None)
+          return
+        continue
+      items = [item]
+      while not queue.empty():
+        items.append(queue.get_nowait())
+      for batch in coalesce(items):
+        await self._wait_for_slot(channel.id)
+        kwargs = {}
+        content = '\n'.join(part.content for part in batch if part.content)
+        if content:
+          kwargs['content'] = content
+        embeds = [embed for part in batch for embed in part.embeds]
+        if embeds:
+          kwargs['embeds'] = embeds
+        if batch[0].files:
+          kwargs['files'] = batch[0].files
+        try:
+          message = await channel.send(**kwargs)
+        except Exception as e:
+          for part in batch:
+            if not part.future.done():
+              part.future.set_exception(e)
+          continue
+        for part in batch:
+          if not part.future.done():
+            part.future.set_result(message)
+
+
+send_scheduler = SendScheduler()
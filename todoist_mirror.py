@@ -0,0 +1,202 @@
+# todoist_mirror.py
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, time as day_start, timedelta
+
+import pytz
+
+from daily_updates import fetch_completed_tasks_from_todoist
+from http_client import get_session, service_url
+
+central_tz = pytz.timezone('America/Chicago')
+
+# A mirror that webhooks are actively updating is read as-is for this long
+# after its last sync
+TODOIST_MIRROR_MAX_AGE_SECONDS = float(
+    os.getenv('TODOIST_MIRROR_MAX_AGE_SECONDS', '3600'))
+
+
+def start_of_yesterday():
+  yesterday = datetime.now(central_tz).date() - timedelta(days=1)
+  return central_tz.localize(datetime.combine(yesterday, day_start()))
+
+
+def _parse_completed_at(completed_at):
+  return datetime.fromisoformat(completed_at.replace('Z', '+00:00'))
+
+
+class TodoistMirror:
+  """Local copy of one user's Todoist items, kept current with sync tokens.
+
+  Open items are keyed by id. Completions since yesterday are kept
+  separately, keyed by completion, so the "completed yesterday" view can be
+  answered locally. They come from the completion log rather than from
+  `checked` deltas: completing a recurring task only reschedules it.
+  """
+
+  def __init__(self, todoist_token):
+    self.todoist_token = todoist_token
+    self.sync_token = '*'
+    self.todoist_user_id = None
+    self.items = {}
+    self.completed = {}
+    self.synced_at = None
+    self.last_webhook_at = None
+    self.lock = asyncio.Lock()
+
+  def apply_item(self, item):
+    item_id = str(item['id'])
+    if item.get('is_deleted') or item.get('checked'):
+      self.items.pop(item_id, None)
+    else:
+      self.items[item_id] = item
+
+  def set_completed(self, completed_tasks):
+    """Replaces the completions with a fetch of the completion log."""
+    self.completed = {}
+    for task in completed_tasks:
+      self.record_completion(task.get('id') or task['task_id'],
+                             task['task_id'], task['content'],
+                             task['completed_at'])
+
+  def record_completion(self, completion_id, task_id, content, completed_at):
+    self.completed[str(completion_id)] = {
+        'task_id': str(task_id),
+        'content': content,
+        'completed_at': completed_at
+    }
+
+  def forget_completions(self, task_id):
+    task_id = str(task_id)
+    for completion_id, task in list(self.completed.items()):
+      if task['task_id'] == task_id:
+        del self.completed[completion_id]
+
+  def prune_completed(self, before):
+    for item_id, task in list(self.completed.items()):
+      if _parse_completed_at(task['completed_at']) < before:
+        del self.completed[item_id]
+
+  def _due_tasks(self, matches):
+    tasks = []
+    for item in sorted(self.items.values(),
+                       key=lambda item: item.get('child_order', 0)):
+      due = item.get('due')
+      if due and matches(due['date'][:10]):
+        tasks.append((item['content'], due['date']))
+    return tasks
+
+  def today_tasks(self, today):
+    today = today.isoformat()
+    return self._due_tasks(lambda due_date: due_date == today)
+
+  def overdue_tasks(self, today):
+    today = today.isoformat()
+    return self._due_tasks(lambda due_date: due_date < today)
+
+  def completed_tasks_since(self, since):
+    return [
+        task for task in sorted(self.completed.values(),
+                                key=lambda task: task['completed_at'])
+        if _parse_completed_at(task['completed_at']) >= since
+    ]
+
+
+# discord_id -> TodoistMirror, plus a Todoist user id index for webhooks
+_mirrors = {}
+_mirrors_by_todoist_user = {}
+
+
+def get_mirror(discord_id):
+  return _mirrors.get(int(discord_id))
+
+
+async def _sync_request(todoist_token, sync_token):
+  headers = {"Authorization": f"Bearer {todoist_token}"}
+  data = {
+      'sync_token': sync_token,
+      'resource_types': json.dumps(['items', 'user'])
+  }
+  async with get_session().post(service_url('todoist_sync', "/sync"),
+                                headers=headers,
+                                data=data) as response:
+    if response.status != 200:
+      error = await response.text()
+      raise RuntimeError(f"Todoist sync failed: {response.status} - {error}")
+    return await response.json()
+
+
+async def sync_todoist_mirror(discord_id, todoist_token):
+  """Brings a user's mirror up to date and returns it.
+
+  The first call does a full sync, later calls only fetch deltas since the
+  stored sync token.
+  """
+  discord_id = int(discord_id)
+  mirror = _mirrors.get(discord_id)
+  if mirror is None or mirror.todoist_token != todoist_token:
+    mirror = _mirrors[discord_id] = TodoistMirror(todoist_token)
+
+  async with mirror.lock:
+    # Item deltas never show recurring completions, so the completed view is
+    # refreshed from the completion log alongside every sync
+    response, completed_tasks = await asyncio.gather(
+        _sync_request(todoist_token, mirror.sync_token),
+        fetch_completed_tasks_from_todoist(todoist_token))
+    if response.get('full_sync'):
+      mirror.items.clear()
+    mirror.set_completed(completed_tasks)
+    for item in response.get('items', []):
+      mirror.apply_item(item)
+    if response.get('user'):
+      mirror.todoist_user_id = str(response['user']['id'])
+      _mirrors_by_todoist_user[mirror.todoist_user_id] = mirror
+    mirror.sync_token = response['sync_token']
+    mirror.synced_at = time.time()
+
+    mirror.prune_completed(start_of_yesterday())
+  return mirror
+
+
+async def get_todoist_mirror(discord_id, todoist_token):
+  """Returns a user's mirror, syncing only when webhooks can't be relied on.
+
+  Todoist only sends webhooks for users who authorized the OAuth app, so a
+  sync is skipped only for mirrors that have received one recently.
+  """
+  mirror = _mirrors.get(int(discord_id))
+  now = time.time()
+  if mirror is not None and mirror.todoist_token == todoist_token \
+      and mirror.last_webhook_at is not None \
+      and now - mirror.last_webhook_at < TODOIST_MIRROR_MAX_AGE_SECONDS \
+      and now - mirror.synced_at < TODOIST_MIRROR_MAX_AGE_SECONDS:
+    return mirror
+  return await sync_todoist_mirror(discord_id, todoist_token)
+
+
+def apply_webhook_event(payload):
+  """Applies one Todoist webhook item event to the matching mirror."""
+  event_name = payload.get('event_name', '')
+  item = payload.get('event_data')
+  if not event_name.startswith('item:') or not item:
+    return
+  mirror = _mirrors_by_todoist_user.get(str(payload.get('user_id')))
+  if mirror is None:
+    # Users without a mirror get a full sync on their next daily update
+    return
+
+  mirror.last_webhook_at = time.time()
+  # event_data is the item's state after the event; a completed recurring
+  # task arrives unchecked with its next due date, so it stays open
+  item = dict(item)
+  if event_name == 'item:deleted':
+    item['is_deleted'] = True
+  elif event_name == 'item:completed':
+    completed_at = item.get('completed_at') or payload.get('triggered_at')
+    mirror.record_completion(f"{item['id']}:{completed_at}", item['id'],
+                             item['content'], completed_at)
+  elif event_name == 'item:uncompleted':
+    mirror.forget_completions(item['id'])
+  mirror.apply_item(item)
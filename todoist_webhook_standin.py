@@ -0,0 +1,74 @@
+# todoist_webhook_standin.py
+# Local stand-in for Todoist: posts signed item events to the bot's webhook.
+#
+#   TODOIST_CLIENT_SECRET=secret python todoist_webhook_standin.py \
+#       --user-id 1234567 --count 50
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+
+import requests
+
+EVENTS = ['item:added', 'item:updated', 'item:completed', 'item:deleted']
+
+
+def sign(body, secret):
+  digest = hmac.new(secret.encode(), body, hashlib.sha256).digest()
+  return base64.b64encode(digest).decode()
+
+
+def make_event(event_name, todoist_user_id, item_id, index):
+  now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+  return {
+      'event_name': event_name,
+      'user_id': todoist_user_id,
+      'triggered_at': now,
+      'event_data': {
+          'id': item_id,
+          'content': f"Stand-in task {index}",
+          'checked': event_name == 'item:completed',
+          'completed_at': now if event_name == 'item:completed' else None,
+          'child_order': index,
+          'due': {
+              'date': datetime.now().date().isoformat()
+          },
+      }
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      description="Post signed Todoist item events to the bot webhook.")
+  parser.add_argument('--url', default='http://localhost:8080/todoist/webhook')
+  parser.add_argument('--secret', default=os.getenv('TODOIST_CLIENT_SECRET'))
+  parser.add_argument('--user-id', required=True,
+                      help="Todoist user id of a synced mirror")
+  parser.add_argument('--count', type=int, default=10)
+  parser.add_argument('--bad-signature', action='store_true',
+                      help="Send an invalid signature; expect 401")
+  args = parser.parse_args()
+  if not args.secret:
+    parser.error("--secret or TODOIST_CLIENT_SECRET is required")
+
+  session = requests.Session()
+  for index in range(args.count):
+    event_name = EVENTS[index % len(EVENTS)]
+    event = make_event(event_name, args.user_id, str(uuid.uuid4()), index)
+    body = json.dumps(event).encode()
+    signature = 'invalid' if args.bad_signature else sign(body, args.secret)
+    response = session.post(args.url,
+                            data=body,
+                            headers={
+                                'Content-Type': 'application/json',
+                                'X-Todoist-Hmac-SHA256': signature
+                            })
+    print(f"{event_name}: {response.status_code}")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,35 @@
+# ttl_cache.py
+import time
+
+
+class TTLCache:
+  """Small dict-backed cache whose entries expire after `ttl_seconds`."""
+
+  def __init__(self, ttl_seconds):
+    self.ttl_seconds = ttl_seconds
+    self._entries = {}
+
+  def get(self, key):
+    entry = self._entries.get(key)
+    if entry is None:
+      return None
+    expires_at, value = entry
+    if time.monotonic() >= expires_at:
+      del self._entries[key]
+      return None
+    return value
+
+  def set(self, key, value):
+    self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+
+  def pop(self, key):
+    value = self.get(key)
+    self._entries.pop(key, None)
+    return value
+
+  def invalidate(self, predicate=None):
+    if predicate is None:
+      self._entries.clear()
+      return
+    for key in [key for key in self._entries if predicate(key)]:
+      del self._entries[key]
@@ -0,0 +1,40 @@
+# voice_queue.py
+import asyncio
+
+
+class VoiceEventQueue:
+  """Routes voice events into one queue per guild drained by a single worker.
+
+  The worker waits `debounce_seconds` after the first event of a burst and
+  hands every event queued by then to `handler(guild_id, events)` in one
+  call, so a team joining together is evaluated once and evaluations for a
+  guild never overlap.
+  """
+
+  def __init__(self, handler, debounce_seconds=2.0):
+    self._handler = handler
+    self.debounce_seconds = debounce_seconds
+    self._queues = {}
+    self._workers = {}
+
+  def submit(self, guild_id, event):
+    queue = self._queues.get(guild_id)
+    if queue is None:
+      queue = self._queues[guild_id] = asyncio.Queue()
+    worker = self._workers.get(guild_id)
+    if worker is None or worker.done():
+      self._workers[guild_id] = asyncio.create_task(
+          self._drain(guild_id, queue))
+    queue.put_nowait(event)
+
+  async def _drain(self, guild_id, queue):
+    while True:
+      events = [await queue.get()]
+      if self.debounce_seconds > 0:
+        await asyncio.sleep(self.debounce_seconds)
+      while not queue.empty():
+        events.append(queue.get_nowait())
+      try:
+        await self._handler(guild_id, events)
+      except Exception as e:
+        print(f"Error processing voice events for guild {guild_id}: {e}")
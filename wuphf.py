@@ -1,6 +1,6 @@
 import os
 from twilio.rest import Client
-from database import database
+from profiles import load_profile
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -58,12 +58,14 @@ def make_call(to_number):
 # Fetch user contact details from the database using Discord ID
 async def get_user_contact(guild_id, discord_id):
   print(f"Fetching contact for guild_id: {guild_id}, discord_id: {discord_id}")  # Debug print
-  query = """
-  SELECT primary_phone, secondary_phone, email
-  FROM users
-  WHERE guild_id = :guild_id AND discord_id = :discord_id;
-  """
-  result = await database.fetch_one(query, {'guild_id': guild_id, 'discord_id': discord_id})
+  profile = await load_profile(guild_id, discord_id)
+  if profile is None:
+    return None
+  # Only the contact fields; the profile also carries API tokens
+  result = {
+      field: profile[field]
+      for field in ('primary_phone', 'secondary_phone', 'email')
+  }
   print(f"Query result: {result}")  # Debug print
   return result
 